@@ -0,0 +1,123 @@
+"""
+Checkpoint 序列化基准：默认 InMemorySaver vs 压缩 + 剪枝
+
+模拟多个线程的多轮对话（与 weather agent 类似的消息 State），对比：
+- default：InMemorySaver + JsonPlusSerializer（msgpack，不压缩，不剪枝）
+- zstd：PruningSaver + CompressedSerializer
+- zstd-dict：PruningSaver + 用典型 State 训练过字典的 CompressedSerializer
+
+指标：每个 checkpoint 占用的字节数、put / get_tuple 平均延迟。
+
+运行：
+    PYTHONPATH=. python demos/01_weather_agent/bench_checkpoint.py --threads 20 --turns 30
+"""
+
+import argparse
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import StateGraph, MessagesState, START, END
+
+from shared.checkpoint import CompressedSerializer, PruningSaver
+
+CITIES = ["佛罗里达", "旧金山", "北京", "上海", "深圳", "杭州", "成都", "西安"]
+
+
+def fake_agent(state: MessagesState) -> dict:
+    """模拟天气 Agent 的回复，不调用模型"""
+    question = state["messages"][-1].content
+    city = CITIES[len(state["messages"]) % len(CITIES)]
+    return {"messages": [AIMessage(
+        content=f"关于「{question}」：{city}总是阳光明媚！今天气温 25 摄氏度，"
+                f"湿度 60%，东南风 3 级，适合出门——天气好到让人“晴”不自禁。",
+        response_metadata={"model_name": "gpt-5.2", "finish_reason": "stop"},
+    )]}
+
+
+def build_graph(checkpointer):
+    graph = StateGraph(MessagesState)
+    graph.add_node("agent", fake_agent)
+    graph.add_edge(START, "agent")
+    graph.add_edge("agent", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def stored_bytes(saver: InMemorySaver) -> tuple[int, int]:
+    """返回 (总字节数, checkpoint 数)"""
+    total = 0
+    count = 0
+    for namespaces in saver.storage.values():
+        for checkpoints in namespaces.values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                total += len(checkpoint[1]) + len(metadata[1])
+                count += 1
+    total += sum(len(blob[1]) for blob in saver.blobs.values())
+    total += sum(len(w[2][1]) for writes in saver.writes.values() for w in writes.values())
+    return total, count
+
+
+def run(name: str, saver: InMemorySaver, threads: int, turns: int) -> None:
+    app = build_graph(saver)
+    put_time = 0.0
+    put_calls = 0
+    original_put = saver.put
+
+    def timed_put(*args, **kwargs):
+        nonlocal put_time, put_calls
+        start = time.perf_counter()
+        try:
+            return original_put(*args, **kwargs)
+        finally:
+            put_time += time.perf_counter() - start
+            put_calls += 1
+
+    saver.put = timed_put
+
+    for turn in range(turns):
+        for t in range(threads):
+            config = {"configurable": {"thread_id": str(t)}}
+            app.invoke({"messages": [HumanMessage(content=f"第 {turn} 轮：{CITIES[t % len(CITIES)]}天气怎么样？")]}, config)
+
+    start = time.perf_counter()
+    for t in range(threads):
+        saver.get_tuple({"configurable": {"thread_id": str(t)}})
+    load_time = time.perf_counter() - start
+
+    total, count = stored_bytes(saver)
+    print(
+        f"{name:<10} checkpoints={count:<6} 总占用={total / 1024:>9.1f} KB  "
+        f"每个={total / max(count, 1):>9.1f} B  "
+        f"put={put_time / max(put_calls, 1) * 1e6:>7.1f} µs  "
+        f"load={load_time / threads * 1e6:>7.1f} µs"
+    )
+
+
+def typical_states(n: int) -> list[dict]:
+    """构造用于训练字典的典型 State"""
+    messages = []
+    states = []
+    for i in range(n):
+        messages = messages + [HumanMessage(content=f"{CITIES[i % len(CITIES)]}天气怎么样？")]
+        messages = messages + fake_agent({"messages": messages})["messages"]
+        states.append({"messages": list(messages[-6:])})
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpoint 序列化基准")
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--keep-last", type=int, default=5, help="每个线程保留的 checkpoint 数")
+    args = parser.parse_args()
+
+    run("default", InMemorySaver(), args.threads, args.turns)
+    run("zstd", PruningSaver(keep_last=args.keep_last, serde=CompressedSerializer()),
+        args.threads, args.turns)
+    trained = CompressedSerializer.train(typical_states(200))
+    run("zstd-dict", PruningSaver(keep_last=args.keep_last, serde=trained),
+        args.threads, args.turns)
+
+
+if __name__ == "__main__":
+    main()
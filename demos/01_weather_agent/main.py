@@ -3,7 +3,7 @@ from shared import setup
 from langchain.agents import create_agent
 from langchain.chat_models import init_chat_model
 from langchain.tools import tool, ToolRuntime
-from langgraph.checkpoint.memory import InMemorySaver
+from shared.checkpoint import CompressedSerializer, PruningSaver
 
 setup()
 
@@ -51,8 +51,8 @@ class ResponseFormat:
     # 天气的任何有趣信息（如果有）
     weather_conditions: str | None = None
 
-# 设置记忆
-checkpointer = InMemorySaver()
+# 设置记忆：msgpack + zstd 压缩，每个对话线程只保留最近 5 个 checkpoint
+checkpointer = PruningSaver(keep_last=5, serde=CompressedSerializer())
 
 # 创建代理
 agent = create_agent(
@@ -0,0 +1,73 @@
+"""
+搜索工具缓存基准：无缓存 vs tool_cache
+
+模拟多个子问题并行研究时的工具调用：各子问题的查询大量重叠（同一关键词的不同写法、
+跨子问题的重复查询），搜索后端用 FakeSearchBackend 模拟外部 API 的延迟，不需要网络。
+
+指标：实际请求后端的次数、缓存命中率、并发合并次数、总耗时。
+
+运行：
+    PYTHONPATH=. python demos/08_research_report/bench_search_cache.py --workers 4 --latency 0.2
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from search_backend import FakeSearchBackend
+from shared.metrics import metrics
+from shared.toolcache import tool_cache
+
+KEYWORDS = ["人工智能 医疗", "AI 医疗影像", "医疗大模型", "智慧医院", "药物研发 AI"]
+# 同一查询的不同写法：规范化后应命中同一条缓存
+VARIANTS = [lambda q: q, lambda q: q.upper(), lambda q: f" {q} ", lambda q: q.replace(" ", "  ")]
+
+
+def make_workload(sub_questions: int, calls: int, seed: int) -> list[list[str]]:
+    rng = random.Random(seed)
+    return [
+        [rng.choice(VARIANTS)(rng.choice(KEYWORDS)) for _ in range(calls)]
+        for _ in range(sub_questions)
+    ]
+
+
+def run(workload: list[list[str]], workers: int, latency: float, cached: bool) -> dict:
+    backend = FakeSearchBackend(latency=latency)
+    search = tool_cache(ttl=600)(backend.web) if cached else backend.web
+    metrics.reset()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # 每个子问题内部串行调用（ReAct 一轮一轮地调），子问题之间并行
+        list(pool.map(lambda queries: [search(q) for q in queries], workload))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(queries) for queries in workload)
+    return {
+        "backend_calls": sum(backend.calls.values()),
+        "hit_rate": metrics.get("tool_cache.hits") / total,
+        "coalesced": int(metrics.get("tool_cache.coalesced")),
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sub-questions", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=6, help="每个子问题的工具调用次数")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟的后端延迟（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workload = make_workload(args.sub_questions, args.calls, args.seed)
+    print(f"{'mode':<10}{'backend calls':>15}{'hit rate':>10}{'coalesced':>11}{'seconds':>9}")
+    for cached in (False, True):
+        result = run(workload, args.workers, args.latency, cached)
+        print(f"{'cached' if cached else 'none':<10}{result['backend_calls']:>15}"
+              f"{result['hit_rate']:>10.1%}{result['coalesced']:>11}{result['seconds']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,38 +4,94 @@ Demo 08: 深度研报系统 (Deep Research Report)
 多 Agent 协作架构：Supervisor + Pipeline + Reflection
 - Planner：将用户主题拆解为子研究问题
 - Researcher：对每个子问题搜集资料（ReAct Agent + 工具）
+- Compressor：并行把每个子问题的资料压缩成定长摘要（Map-Reduce 的 Map）
 - Analyst：交叉分析，提炼关键洞察
 - Writer：撰写结构化研报
 - Reviewer：质量审核，不合格退回修改（Reflection）
 
 图结构：
-  START → planner → researcher → analyst → writer → reviewer
-                                             ↑          │
-                                             └── revise ─┘ (max 2 rounds)
-                                                        │
-                                                        └── END (final_report)
+  START → planner → researcher → compressor → analyst → writer → reviewer
+                                                          ↑          │
+                                                          └── revise ─┘ (max 2 rounds)
+                                                                     │
+                                                                     └── END (final_report)
 """
 
+import logging
 import os
-import json
+import re
+import time
 import operator
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import TypedDict, Annotated, Literal
 from shared import setup
 
 import gradio as gr
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import create_react_agent
+from shared.cancel import CancelToken, Cancelled, record_run, summary as cancel_summary
+from shared.artifacts import artifacts, format_age
+from shared.checkpoint import PruningSaver
+from shared.dedup import cluster
+from shared.metrics import metrics
+from shared.structured import invoke_json, summary as structured_summary
+from shared.sections import Section, split_sections, join_sections, number_sections, outline
+from shared.singleflight import SingleFlight
+from shared.text import normalize_text
+from shared.tokens import estimate_tokens, truncate_to_tokens
+from shared.toolcache import tool_cache, summary as tool_cache_summary
+from shared.toolguard import tool_guard
+from shared.ui import FrameThrottle, LiveDraft, ProgressLog, merge_frames
+from search_backend import FakeSearchBackend
 
 setup()
 
+logger = logging.getLogger(__name__)
+
 # ======================== 全局模型 ========================
 
 llm = init_chat_model("openai:gpt-5.2", temperature=0)
 creative_llm = init_chat_model("openai:gpt-5.2", temperature=0.7)
 
+# 每个子问题的摘要 token 预算
+DIGEST_TOKEN_BUDGET = 400
+# 进度面板里子问题研究结论的预览长度
+FINDING_PREVIEW_TOKENS = 80
+# 批量 LLM 调用（资料压缩、章节重写）的最大并发数
+MAX_CONCURRENCY = 4
+
+# 审核不通过时只重写 Reviewer 点名的章节（False 则整篇重写）
+SECTION_REVISION = True
+
+# 近似去重阈值（MinHash 估计的 Jaccard 相似度）：子问题按字符 2-gram，资料条目按 3-gram
+SUBQUESTION_DEDUP_THRESHOLD = 0.4
+FINDING_DEDUP_THRESHOLD = 0.7
+# 参与去重的资料条目最短长度（字符，不含列表符号）
+MIN_FINDING_CHARS = 12
+
+# 同一主题的研报在该时长（秒）内直接返回缓存结果
+REPORT_CACHE_TTL = 24 * 3600
+
+# 每次运行的预算：墙钟时间（秒）与 token 数（估算）
+TIME_BUDGET = 300
+TOKEN_BUDGET = 80_000
+# 各环节的预估开销 (秒, token)，用于判断剩余预算还够做什么
+SUB_QUESTION_COST = (30, 5_000)   # 研究 + 压缩一个子问题
+REVISION_COST = (45, 8_000)       # 一轮修改 + 复审
+DOWNSTREAM_COST = (60, 12_000)    # 分析 + 初稿 + 首轮审核，研究阶段必须给它们留够
+# 预算至少保留的子问题数
+MIN_SUB_QUESTIONS = 2
+# 单个子问题 ReAct 的最大工具轮数：预算充足时 / 预算紧张时
+MAX_REACT_STEPS = 6
+REACT_STEPS_UNDER_PRESSURE = 2
+# Researcher 同一轮发出多个工具调用时的最大并行数（ToolNode 按 max_concurrency 限制线程池）
+TOOL_CONCURRENCY = 3
+
 
 # ======================== State 定义 ========================
 
@@ -43,53 +99,140 @@ class ResearchState(TypedDict):
     topic: str                    # 用户输入的研究主题
     sub_questions: list[str]      # Planner 拆解的子问题
     research_data: Annotated[list[str], operator.add]  # Researcher 搜集的资料（可追加）
+    research_digests: list[str]   # Compressor 压缩后的子问题摘要
     analysis: str                 # Analyst 分析结论
     draft: str                    # Writer 撰写的初稿
     review: str                   # Reviewer 的审核意见
     review_score: int             # Reviewer 的评分 (1-10)
+    flagged_sections: list[dict]  # Reviewer 点名需修改的章节 [{"index": 章节编号, "feedback": 意见}]
+    revised_sections: list[int]   # Writer 本轮重写的章节编号（空表示整篇重写）
     final_report: str             # 最终输出的研报
     revision_count: int           # 已修改次数
+    started_at: float             # 本次运行的开始时间（时间戳）
+    time_budget: float            # 本次运行的时间预算（秒）
+    token_budget: int             # 本次运行的 token 预算
+    tokens_used: Annotated[int, operator.add]        # 已消耗的 token（估算，各节点累加）
+    degradations: Annotated[list[str], operator.add]  # 因预算不足采取的降级措施
+    budget_exhausted: bool        # 预算已不够再修改一轮，Reviewer 的结论即为终稿
     progress: Annotated[list[str], operator.add]  # 各阶段进度日志
 
 
-# ======================== 搜索工具（模拟）========================
+# ======================== 搜索工具 ========================
+
+# 默认使用离线的模拟后端 — 实际项目中可接入 Tavily / SerpAPI 等（见 search_backend.py）
+search_backend = FakeSearchBackend()
+
+# 搜索结果缓存时长（秒）：网页变化快，论文几乎不变
+WEB_SEARCH_TTL = 10 * 60
+ACADEMIC_SEARCH_TTL = 24 * 3600
+MARKET_DATA_TTL = 60 * 60
+# 单次搜索的超时（秒）：超时返回「工具不可用」，Researcher 换用其他工具继续
+SEARCH_TIMEOUT = 8
+
 
 @tool
+@tool_guard(timeout=SEARCH_TIMEOUT, hedge=True)
+@tool_cache(ttl=WEB_SEARCH_TTL)
 def web_search(query: str) -> str:
     """搜索互联网获取相关信息。输入搜索关键词，返回搜索结果摘要。"""
-    # 模拟搜索结果 — 实际项目中可接入 Tavily / SerpAPI 等
-    return (
-        f"【搜索结果 - {query}】\n"
-        f"1. 根据最新研究数据显示，{query}领域在2024-2025年呈现显著增长趋势，"
-        f"年均增长率约15-20%。\n"
-        f"2. 行业专家指出，{query}的核心驱动因素包括技术创新、政策支持和市场需求三个维度。\n"
-        f"3. 主要挑战包括：人才短缺、标准化不足、投资回报周期长等。\n"
-        f"4. 预计到2026年，该领域市场规模将达到当前的2-3倍。\n"
-        f"5. 领先企业已开始布局下一代技术路线，竞争格局正在重塑。"
-    )
+    return search_backend.web(query)
 
 
 @tool
+@tool_guard(timeout=SEARCH_TIMEOUT)
+@tool_cache(ttl=ACADEMIC_SEARCH_TTL)
 def search_academic_papers(query: str) -> str:
     """搜索学术论文和研究报告。输入研究主题，返回相关学术成果。"""
-    return (
-        f"【学术论文 - {query}】\n"
-        f"1. 《{query}的前沿进展与未来展望》(2025) - 综述了该领域最新理论框架和实证研究。\n"
-        f"2. 《基于数据驱动的{query}分析方法》(2024) - 提出了新的量化分析模型。\n"
-        f"3. 《{query}的国际比较研究》(2025) - 对比了中美欧三大市场的发展路径。"
-    )
+    return search_backend.academic(query)
 
 
 @tool
+@tool_guard(timeout=SEARCH_TIMEOUT, hedge=True)
+@tool_cache(ttl=MARKET_DATA_TTL)
 def search_market_data(query: str) -> str:
     """搜索市场数据和统计信息。输入查询内容，返回相关市场数据。"""
-    return (
-        f"【市场数据 - {query}】\n"
-        f"- 2024年市场规模：约 850 亿美元\n"
-        f"- 2025年预估市场规模：约 1020 亿美元（同比增长 20%）\n"
-        f"- 主要参与者市场份额：头部企业占比约 45%，中小企业占比 55%\n"
-        f"- 投融资情况：2024年全年融资事件超 200 起，总额约 150 亿美元"
-    )
+    return search_backend.market(query)
+
+
+# ======================== 结构化输出 Schema ========================
+
+PLAN_SCHEMA = {
+    "title": "research_plan",
+    "type": "object",
+    "properties": {
+        "sub_questions": {"type": "array", "items": {"type": "string"}, "description": "3-5 个子研究问题"},
+    },
+    "required": ["sub_questions"],
+}
+
+REVIEW_SCHEMA = {
+    "title": "report_review",
+    "type": "object",
+    "properties": {
+        "scores": {"type": "object", "additionalProperties": {"type": "integer"}},
+        "overall_score": {"type": "integer", "minimum": 1, "maximum": 10},
+        "passed": {"type": "boolean"},
+        "feedback": {"type": "string"},
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"index": {"type": "integer"}, "feedback": {"type": "string"}},
+                "required": ["index", "feedback"],
+            },
+        },
+    },
+    "required": ["overall_score", "passed", "feedback"],
+}
+
+
+# ======================== 运行预算 ========================
+
+def initial_state(topic: str) -> dict:
+    return {
+        "topic": topic,
+        "revision_count": 0,
+        "started_at": time.time(),
+        "time_budget": TIME_BUDGET,
+        "token_budget": TOKEN_BUDGET,
+    }
+
+
+def remaining(state: ResearchState) -> tuple[float, float]:
+    """剩余的 (秒, token)；未设置预算时视为无限"""
+    seconds = state.get("started_at", 0) + state.get("time_budget", float("inf")) - time.time()
+    tokens = state.get("token_budget", float("inf")) - state.get("tokens_used", 0)
+    return seconds, tokens
+
+
+def affordable(state: ResearchState, cost: tuple[float, int], reserve: tuple[float, int] = (0, 0)) -> float:
+    """在预留 reserve 之后，剩余预算还够做几份 cost"""
+    seconds, tokens = remaining(state)
+    return min((seconds - reserve[0]) / cost[0], (tokens - reserve[1]) / cost[1])
+
+
+def spent(messages: list, output: str) -> int:
+    """估算一次模型调用的 token 消耗（输入 + 输出）"""
+    return sum(estimate_tokens(m.content) for m in messages) + estimate_tokens(output)
+
+
+def react_spent(messages: list) -> int:
+    """估算一次 ReAct 运行的 token 消耗：每一步都会把之前的全部消息重新发给模型"""
+    total = context = 0
+    for msg in messages:
+        if isinstance(msg, AIMessage):
+            total += context
+        context += estimate_tokens(msg.content if isinstance(msg.content, str) else str(msg.content))
+    return total + sum(estimate_tokens(m.content) for m in messages if isinstance(m, AIMessage))
+
+
+def react_findings(messages: list) -> str:
+    """ReAct 的最终回答；步数用尽时没有正常回答，退回到已拿到的工具结果"""
+    final = messages[-1]
+    if isinstance(final, AIMessage) and final.content and not final.tool_calls \
+            and not final.content.startswith("Sorry, need more steps"):
+        return final.content
+    return "\n\n".join(m.content for m in messages if isinstance(m, ToolMessage))
 
 
 # ======================== 各 Agent 节点 ========================
@@ -98,7 +241,7 @@ def planner_node(state: ResearchState) -> dict:
     """Planner Agent：拆解研究主题为子问题"""
     topic = state["topic"]
 
-    response = llm.invoke([
+    messages = [
         SystemMessage(content="""你是一位资深研究策划专家。
 你的任务是将用户给出的研究主题拆解为 3-5 个具体的子研究问题。
 
@@ -107,21 +250,25 @@ def planner_node(state: ResearchState) -> dict:
 2. 子问题之间不重叠，且合在一起能全面覆盖主题
 3. 每个子问题应具体、可搜索
 
-请以 JSON 数组格式返回，例如：
-["问题1", "问题2", "问题3"]
+请以 JSON 格式返回，例如：
+{"sub_questions": ["问题1", "问题2", "问题3"]}
 
 只返回 JSON，不要其他内容。"""),
         HumanMessage(content=f"研究主题：{topic}")
-    ])
-
-    try:
-        # 尝试解析 JSON
-        content = response.content.strip()
-        # 处理可能的 markdown 代码块包裹
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        sub_questions = json.loads(content)
-    except (json.JSONDecodeError, IndexError):
+    ]
+    result = invoke_json(llm, messages, PLAN_SCHEMA, name="planner")
+
+    sub_questions = [q for q in (result or {}).get("sub_questions", []) if isinstance(q, str) and q.strip()]
+    merged = 0
+    if sub_questions:
+        # 合并近似重复的子问题，避免 Researcher 做两遍几乎相同的搜索。
+        # 子问题大多带着主题原文，主题的 n-gram 不参与比较；合并后至少保留 MIN_SUB_QUESTIONS 个
+        reps = cluster(sub_questions, SUBQUESTION_DEDUP_THRESHOLD, k=2, ignore=topic)
+        keep = {i for i, rep in enumerate(reps) if rep == i}
+        keep |= set(sorted(set(range(len(sub_questions))) - keep)[:max(0, MIN_SUB_QUESTIONS - len(keep))])
+        merged = len(sub_questions) - len(keep)
+        sub_questions = [q for i, q in enumerate(sub_questions) if i in keep]
+    else:
         sub_questions = [
             f"{topic}的发展现状和市场规模",
             f"{topic}的核心技术和创新趋势",
@@ -129,9 +276,19 @@ def planner_node(state: ResearchState) -> dict:
             f"{topic}的未来发展前景和投资机会",
         ]
 
+    # 预算只够研究其中几个子问题时，保留前面的（Planner 通常把核心维度排在前面）
+    degradations = []
+    limit = max(MIN_SUB_QUESTIONS, int(affordable(state, SUB_QUESTION_COST, reserve=DOWNSTREAM_COST)))
+    if len(sub_questions) > limit:
+        degradations.append(f"子问题 {len(sub_questions)} → {limit} 个")
+        sub_questions = sub_questions[:limit]
+
     return {
         "sub_questions": sub_questions,
-        "progress": [f"📋 **Planner** 已将主题拆解为 {len(sub_questions)} 个子问题：\n" +
+        "tokens_used": spent(messages, str(result)),
+        "degradations": degradations,
+        "progress": [f"📋 **Planner** 已将主题拆解为 {len(sub_questions)} 个子问题"
+                     + (f"（合并了 {merged} 个重复子问题）" if merged else "") + "：\n" +
                      "\n".join(f"  {i+1}. {q}" for i, q in enumerate(sub_questions))]
     }
 
@@ -147,39 +304,139 @@ def researcher_node(state: ResearchState) -> dict:
         prompt=(
             "你是一位专业的研究员。针对给定的研究问题，使用搜索工具搜集全面的资料。"
             "请综合多个来源的信息，整理出结构化的研究素材。"
-            "每个问题至少使用 2 个不同的搜索工具获取信息。"
+            "每个问题至少使用 2 个不同的搜索工具获取信息，"
+            "互不依赖的搜索请在同一轮中一起发起，它们会被并行执行。"
         ),
+        # 每个子问题都是独立的对话，不继承外层图的 checkpointer
+        checkpointer=False,
     )
 
+    # 节点要全部子问题完成才返回，每个子问题的起止通过 custom 流即时推送给 UI
+    # （ReAct 内部的工具调用由 subgraphs=True 的子图流推送）
+    writer = get_stream_writer()
     all_data = []
-    progress_log = []
+    degradations = []
+    tokens = 0
+
+    # 剩余预算不够按常规深度做完所有子问题时，限制每个子问题的 ReAct 工具轮数
+    steps = MAX_REACT_STEPS
+    if affordable(state, SUB_QUESTION_COST, reserve=DOWNSTREAM_COST) < len(sub_questions):
+        steps = REACT_STEPS_UNDER_PRESSURE
+        degradations.append(f"ReAct 工具轮数上限 {MAX_REACT_STEPS} → {steps}")
 
     for i, question in enumerate(sub_questions):
-        result = researcher.invoke({
-            "messages": [HumanMessage(content=f"请针对以下问题进行深入研究：{question}")]
-        })
-
-        # 提取最终回答
-        final_msg = result["messages"][-1].content
-        all_data.append(f"### 子问题 {i+1}：{question}\n\n{final_msg}")
-        progress_log.append(
-            f"🔍 **Researcher** 完成子问题 {i+1}/{len(sub_questions)} 的资料搜集"
+        # 已经研究过的子问题足够撑起报告，而剩余时间只够留给下游时，放弃剩下的子问题
+        if i >= MIN_SUB_QUESTIONS and affordable({**state, "tokens_used": state.get("tokens_used", 0) + tokens},
+                                                 SUB_QUESTION_COST, reserve=DOWNSTREAM_COST) < 1:
+            degradations.append(f"跳过 {len(sub_questions) - i} 个子问题的研究")
+            break
+
+        writer({"progress": f"🔍 **Researcher** 开始子问题 {i+1}/{len(sub_questions)}：{question}"})
+        # 每个工具轮次对应 agent → tools 两步，再留两步给收尾：
+        # 步数将尽时 ReAct Agent 会自行停止调用工具，不会抛 GraphRecursionError
+        result = researcher.invoke(
+            {"messages": [HumanMessage(content=f"请针对以下问题进行深入研究：{question}")]},
+            {"recursion_limit": 2 * steps + 2, "max_concurrency": TOOL_CONCURRENCY},
         )
 
+        findings = react_findings(result["messages"])
+        tokens += react_spent(result["messages"])
+        all_data.append(f"### 子问题 {i+1}：{question}\n\n{findings}")
+        excerpt = truncate_to_tokens(findings, FINDING_PREVIEW_TOKENS).replace("\n", " ")
+        writer({"progress": f"✅ **Researcher** 完成子问题 {i+1}/{len(sub_questions)}：\n   > {excerpt}"})
+
     return {
         "research_data": all_data,
-        "progress": progress_log
+        "tokens_used": tokens,
+        "degradations": degradations,
+        "progress": [f"🔍 **Researcher** 已完成 {len(all_data)}/{len(sub_questions)} 个子问题的资料搜集"]
+    }
+
+
+# 资料条目：摘要里的列表项（- / * / • / 1.）
+FINDING_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.、)])\s+")
+# 摘要结构本身的标签行（每份摘要都有，不是资料条目）：**子问题**：… / - **来源**：…
+STRUCTURAL_LABELS = re.compile(r"^\s*(?:[-*•]\s*)?\*\*(?:子问题|关键事实|关键数据|来源)\*\*")
+
+
+def finding_text(line: str) -> str | None:
+    """列表项形式的资料条目返回去掉列表符号的正文；标题、标签行、过短的条目返回 None"""
+    if STRUCTURAL_LABELS.match(line) or not FINDING_BULLET.match(line):
+        return None
+    text = FINDING_BULLET.sub("", line, count=1).strip()
+    return text if len(text) >= MIN_FINDING_CHARS else None
+
+
+def collapse_duplicate_findings(digests: list[str]) -> tuple[list[str], int]:
+    """跨子问题折叠近似重复的资料条目：只保留第一次出现的，返回 (新摘要, 删掉的条数)
+
+    只比较资料条目（列表项）；子问题、来源等结构行原样保留，每份摘要仍带着自己的来源。
+    """
+    lines = [(d, line) for d, digest in enumerate(digests) for line in digest.splitlines()]
+    findings = [(i, text) for i, (_, line) in enumerate(lines) if (text := finding_text(line))]
+    reps = cluster([text for _, text in findings], FINDING_DEDUP_THRESHOLD)
+    dropped = {findings[j][0] for j, rep in enumerate(reps) if rep != j}
+
+    collapsed = [[] for _ in digests]
+    for i, (d, line) in enumerate(lines):
+        if i not in dropped:
+            collapsed[d].append(line)
+    return ["\n".join(kept) for kept in collapsed], len(dropped)
+
+
+def compressor_node(state: ResearchState) -> dict:
+    """Compressor（Map）：并行把每个子问题的资料压缩成结构化摘要"""
+    research_data = state["research_data"]
+
+    # 本身就在预算内的资料无需再调用模型
+    pending = [i for i, data in enumerate(research_data)
+               if estimate_tokens(data) > DIGEST_TOKEN_BUDGET]
+
+    requests = [
+        [
+            SystemMessage(content=f"""你是一位研究助理，负责把一个子问题的调研资料压缩成摘要。
+
+请严格按以下 Markdown 结构输出，总长度控制在 {DIGEST_TOKEN_BUDGET} token 以内：
+**子问题**：原样保留子问题
+**关键事实**：3-5 条，每条一句话
+**关键数据**：保留所有数字、比例、年份及其含义
+**来源**：资料中提到的来源（搜索结果 / 论文 / 市场数据）
+
+不要添加资料中没有的信息。"""),
+            HumanMessage(content=research_data[i]),
+        ]
+        for i in pending
+    ]
+    responses = llm.batch(requests, config={"max_concurrency": MAX_CONCURRENCY}) if pending else []
+
+    digests = list(research_data)
+    for i, response in zip(pending, responses):
+        # 模型偶尔会超出预算，这里做一次硬截断兜底
+        digests[i] = truncate_to_tokens(response.content, DIGEST_TOKEN_BUDGET)
+
+    # 不同子问题的搜索结果常有重叠，折叠重复条目后 Analyst 不必把同一事实读两遍
+    digests, duplicates = collapse_duplicate_findings(digests)
+
+    before = sum(estimate_tokens(d) for d in research_data)
+    after = sum(estimate_tokens(d) for d in digests)
+
+    return {
+        "research_digests": digests,
+        "tokens_used": sum(spent(req, resp.content) for req, resp in zip(requests, responses)),
+        "progress": [f"🗜️ **Compressor** 已压缩 {len(pending)}/{len(research_data)} 份资料"
+                     f"（约 {before} → {after} tokens）"
+                     + (f"，折叠 {duplicates} 条重复资料" if duplicates else "")]
     }
 
 
 def analyst_node(state: ResearchState) -> dict:
-    """Analyst Agent：交叉分析，提炼关键洞察"""
+    """Analyst Agent（Reduce）：基于各子问题摘要交叉分析，提炼关键洞察"""
     topic = state["topic"]
-    research_data = "\n\n---\n\n".join(state["research_data"])
+    research_data = "\n\n---\n\n".join(state["research_digests"])
 
-    response = llm.invoke([
+    messages = [
         SystemMessage(content="""你是一位资深行业分析师。
-根据提供的研究素材，进行交叉分析并提炼关键洞察。
+根据提供的各子问题研究摘要，进行交叉分析并提炼关键洞察。
 
 请从以下维度进行分析：
 1. **核心发现**：最重要的 3-5 个发现
@@ -190,25 +447,75 @@ def analyst_node(state: ResearchState) -> dict:
 
 请输出结构化的分析报告。"""),
         HumanMessage(content=f"研究主题：{topic}\n\n研究素材：\n{research_data}")
-    ])
+    ]
+    response = llm.invoke(messages)
 
     return {
         "analysis": response.content,
+        "tokens_used": spent(messages, response.content),
         "progress": ["📊 **Analyst** 已完成深度分析，提炼出关键洞察"]
     }
 
 
+def revise_sections(state: ResearchState) -> dict | None:
+    """Writer 的增量修改模式：只重写 Reviewer 点名的章节，其余章节原样复用"""
+    sections = split_sections(state["draft"])
+    targets = [f for f in state.get("flagged_sections", []) if 1 <= f["index"] <= len(sections)]
+    if not targets:
+        return None
+
+    requests = [
+        [
+            SystemMessage(content=f"""你是一位专业的研报撰写人，正在根据审核意见修改研报中的一个章节。
+
+全文目录：
+{outline(sections)}
+
+要求：
+- 只输出修改后的第 {f["index"]} 节，保留原有的 Markdown 标题行
+- 与上下文章节保持衔接，不要重复其他章节的内容
+- 每个论点都要有数据或事实支撑"""),
+            HumanMessage(content=f"研究主题：{state['topic']}\n\n分析结果：\n{state['analysis']}\n\n"
+                                 f"审核意见：{f['feedback']}\n\n原章节：\n{sections[f['index'] - 1].text}")
+        ]
+        for f in targets
+    ]
+    responses = creative_llm.batch(requests, config={"max_concurrency": MAX_CONCURRENCY})
+
+    for f, response in zip(targets, responses):
+        old = sections[f["index"] - 1]
+        sections[f["index"] - 1] = Section(title=old.title, text=response.content.strip() + "\n\n")
+
+    revision_count = state.get("revision_count", 0)
+    revised = [f["index"] for f in targets]
+
+    return {
+        "draft": join_sections(sections),
+        "revision_count": revision_count + 1,
+        "revised_sections": revised,
+        "tokens_used": sum(spent(req, resp.content) for req, resp in zip(requests, responses)),
+        "progress": [f"✍️ **Writer** 已完成研报修改稿（第 {revision_count + 1} 版）"
+                     f"— 仅重写第 {', '.join(map(str, revised))} 节，其余 "
+                     f"{len(sections) - len(revised)} 节原样复用"]
+    }
+
+
 def writer_node(state: ResearchState) -> dict:
     """Writer Agent：撰写结构化研报"""
     topic = state["topic"]
     analysis = state["analysis"]
     review = state.get("review", "")
 
+    if SECTION_REVISION and review and state.get("flagged_sections"):
+        result = revise_sections(state)
+        if result is not None:
+            return result
+
     revision_hint = ""
     if review:
         revision_hint = f"\n\n⚠️ 上一轮审核意见（请根据以下反馈修改）：\n{review}"
 
-    response = creative_llm.invoke([
+    messages = [
         SystemMessage(content=f"""你是一位专业的研报撰写人。
 请根据分析师提供的分析结果，撰写一份完整的深度研究报告。
 
@@ -227,7 +534,8 @@ def writer_node(state: ResearchState) -> dict:
 - 使用 Markdown 格式
 - 总字数 1500-2500 字{revision_hint}"""),
         HumanMessage(content=f"研究主题：{topic}\n\n分析结果：\n{analysis}")
-    ])
+    ]
+    response = creative_llm.invoke(messages)
 
     revision_count = state.get("revision_count", 0)
     label = "修改稿" if revision_count > 0 else "初稿"
@@ -235,17 +543,36 @@ def writer_node(state: ResearchState) -> dict:
     return {
         "draft": response.content,
         "revision_count": revision_count + 1,
+        "revised_sections": [],
+        "tokens_used": spent(messages, response.content),
         "progress": [f"✍️ **Writer** 已完成研报{label}（第 {revision_count + 1} 版）"]
     }
 
 
 def reviewer_node(state: ResearchState) -> dict:
-    """Reviewer Agent（Reflection）：审核研报质量"""
+    """Reviewer Agent（Reflection）：审核研报质量
+
+    Writer 只重写了部分章节时，只复审这些章节，其余章节视为上一轮已通过。
+    """
     draft = state["draft"]
     topic = state["topic"]
+    revised = state.get("revised_sections", [])
+    sections = split_sections(draft)
+
+    if SECTION_REVISION and revised:
+        scope = "本轮只修改了部分章节，其余章节已在上一轮审核中认可。请重点判断修改后的章节是否解决了上一轮的问题，并给出全文的综合评分。"
+        review_input = (
+            f"研究主题：{topic}\n\n全文目录：\n{outline(sections)}\n\n"
+            f"上一轮审核意见：{state.get('review', '')}\n\n修改后的章节：\n"
+            + "\n\n".join(f"【第 {i} 节】\n{sections[i - 1].text.strip()}"
+                           for i in revised if i <= len(sections))
+        )
+    else:
+        scope = "请审核整篇研报。"
+        review_input = f"研究主题：{topic}\n\n研报内容：\n{number_sections(sections)}"
 
-    response = llm.invoke([
-        SystemMessage(content="""你是一位严格的研报审核专家。
+    messages = [
+        SystemMessage(content=f"""你是一位严格的研报审核专家。{scope}
 请从以下维度对研报进行评分和审核：
 
 1. **逻辑性** (1-10)：论证是否严密、结构是否清晰
@@ -254,52 +581,81 @@ def reviewer_node(state: ResearchState) -> dict:
 4. **完整性** (1-10)：是否覆盖了主题的核心维度
 
 请输出 JSON 格式：
-{
-  "scores": {"逻辑性": 8, "数据支撑": 7, "可读性": 9, "完整性": 8},
+{{
+  "scores": {{"逻辑性": 8, "数据支撑": 7, "可读性": 9, "完整性": 8}},
   "overall_score": 8,
   "passed": true,
-  "feedback": "具体的审核意见和修改建议..."
-}
+  "feedback": "具体的审核意见和修改建议...",
+  "sections": [{{"index": 3, "feedback": "该节的具体修改意见"}}]
+}}
 
 overall_score >= 7 且无硬伤时 passed 为 true，否则为 false。
+passed 为 false 时，在 sections 中列出需要修改的章节编号（即【第 N 节】中的 N）及修改意见；
+如果问题涉及全文结构、需要整体重写，sections 留空。
 只返回 JSON，不要其他内容。"""),
-        HumanMessage(content=f"研究主题：{topic}\n\n研报内容：\n{draft}")
-    ])
+        HumanMessage(content=review_input)
+    ]
+    result = invoke_json(llm, messages, REVIEW_SCHEMA, name="reviewer")
 
-    try:
-        content = response.content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        result = json.loads(content)
+    if result is not None:
         score = result.get("overall_score", 7)
         feedback = result.get("feedback", "")
         passed = result.get("passed", score >= 7)
         scores_detail = result.get("scores", {})
-    except (json.JSONDecodeError, KeyError):
+        flagged = [
+            {"index": item["index"], "feedback": item.get("feedback", feedback)}
+            for item in result.get("sections", [])
+            if isinstance(item, dict) and isinstance(item.get("index"), int)
+        ]
+    else:
         score = 7
-        feedback = "审核通过，报告质量合格。"
+        feedback = "审核结果解析失败，按合格处理。"
         passed = True
         scores_detail = {}
+        flagged = []
+
+    tokens = spent(messages, str(result))
+
+    # 需要修改但剩余预算不够再来一轮：以当前稿件收尾
+    degradations = []
+    exhausted = False
+    if score < 7 and state.get("revision_count", 0) < 3 \
+            and affordable({**state, "tokens_used": state.get("tokens_used", 0) + tokens}, REVISION_COST) < 1:
+        exhausted = True
+        degradations.append(f"跳过第 {state.get('revision_count', 0)} 轮修改")
 
     scores_str = " | ".join(f"{k}:{v}" for k, v in scores_detail.items()) if scores_detail else ""
-    status = "✅ 通过" if passed else "🔄 需修改"
+    status = "✅ 通过" if passed else ("⏱️ 预算不足，不再修改" if exhausted else "🔄 需修改")
+    flagged_str = f"\n   待修改章节：{', '.join(str(f['index']) for f in flagged)}" if flagged and not passed else ""
 
     return {
         "review": feedback,
         "review_score": score,
+        "flagged_sections": [] if passed else flagged,
+        "tokens_used": tokens,
+        "degradations": degradations,
+        "budget_exhausted": exhausted,
         "progress": [
             f"🔎 **Reviewer** 审核完成 — {status}（综合评分：{score}/10）\n"
             f"   {scores_str}\n"
-            f"   意见：{feedback[:100]}..."
+            f"   意见：{feedback[:100]}...{flagged_str}"
         ]
     }
 
 
 def publish_node(state: ResearchState) -> dict:
-    """输出最终研报"""
+    """输出最终研报，并汇报预算使用情况和采取过的降级措施"""
+    seconds, _ = remaining(state)
+    used = state.get("time_budget", TIME_BUDGET) - seconds
+    degradations = state.get("degradations", [])
     return {
         "final_report": state["draft"],
-        "progress": ["📄 **最终研报已生成** ✅"]
+        "progress": [
+            "📄 **最终研报已生成** ✅",
+            f"⏱️ **Budget** 用时 {used:.0f}/{state.get('time_budget', TIME_BUDGET):.0f}s，"
+            f"约 {state.get('tokens_used', 0)}/{state.get('token_budget', TOKEN_BUDGET)} tokens；"
+            + (f"降级：{'；'.join(degradations)}" if degradations else "未触发降级"),
+        ]
     }
 
 
@@ -310,7 +666,7 @@ def should_revise(state: ResearchState) -> Literal["writer", "publish"]:
     score = state.get("review_score", 10)
     revision_count = state.get("revision_count", 0)
 
-    if score < 7 and revision_count < 3:
+    if score < 7 and revision_count < 3 and not state.get("budget_exhausted"):
         return "writer"
     return "publish"
 
@@ -323,6 +679,7 @@ def build_research_graph():
     # 添加节点
     graph.add_node("planner", planner_node)
     graph.add_node("researcher", researcher_node)
+    graph.add_node("compressor", compressor_node)
     graph.add_node("analyst", analyst_node)
     graph.add_node("writer", writer_node)
     graph.add_node("reviewer", reviewer_node)
@@ -331,7 +688,8 @@ def build_research_graph():
     # 添加边
     graph.add_edge(START, "planner")
     graph.add_edge("planner", "researcher")
-    graph.add_edge("researcher", "analyst")
+    graph.add_edge("researcher", "compressor")
+    graph.add_edge("compressor", "analyst")
     graph.add_edge("analyst", "writer")
     graph.add_edge("writer", "reviewer")
 
@@ -342,53 +700,177 @@ def build_research_graph():
     })
     graph.add_edge("publish", END)
 
-    return graph.compile()
+    # 按主题的 thread_id 保存检查点：运行被取消后，已完成的步骤下次可直接复用
+    return graph.compile(checkpointer=PruningSaver(keep_last=2))
+
+
+research_app = build_research_graph()
+
+
+# ======================== 研报缓存 ========================
+
+# 后台刷新使用的线程池，以及正在刷新的主题（同一主题不重复提交）
+refresh_pool = ThreadPoolExecutor(max_workers=2)
+_refreshing: set[str] = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh(topic: str) -> None:
+    config = {"configurable": {"thread_id": f"refresh:{normalize_text(topic)}"}}
+    try:
+        result = research_app.invoke(initial_state(topic), config)
+        if result.get("final_report"):
+            artifacts.put("report", topic, result["final_report"])
+    finally:
+        research_app.checkpointer.delete_thread(config["configurable"]["thread_id"])
+        with _refreshing_lock:
+            _refreshing.discard(normalize_text(topic))
+
+
+def _log_refresh_failure(future: Future, topic: str) -> None:
+    # 后台刷新没有人等待结果，异常只能在这里记下来，否则会随 future 一起被丢弃
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("后台刷新「%s」失败", topic, exc_info=future.exception())
+
+
+def refresh_report(topic: str) -> str:
+    """在后台重新生成研报并覆盖缓存，立即返回提示"""
+    if not topic.strip():
+        return "⚠️ 请输入研究主题"
+    with _refreshing_lock:
+        if normalize_text(topic) in _refreshing:
+            return f"⏳ 「{topic}」正在后台刷新中，完成后重新生成即可获取新版本"
+        _refreshing.add(normalize_text(topic))
+    future = refresh_pool.submit(_refresh, topic)
+    future.add_done_callback(lambda f: _log_refresh_failure(f, topic))
+    return f"🔄 已在后台刷新「{topic}」，完成后重新生成即可获取新版本"
 
 
 # ======================== Gradio 前端 ========================
 
-research_app = build_research_graph()
+
+def format_tool_calls(update: dict) -> str:
+    """把 ReAct 子图的一次节点更新格式化为工具调用日志"""
+    lines = []
+    for node_output in update.values():
+        for msg in (node_output or {}).get("messages", []):
+            for call in getattr(msg, "tool_calls", None) or []:
+                query = call["args"].get("query", "")
+                lines.append(f"   🔧 `{call['name']}`（{query}）")
+    return "\n".join(lines)
+
+
+# 同一主题的在途研报只跑一次，重复请求挂到已有执行上
+research_flights = SingleFlight("report", merge=merge_frames)
 
 
 def run_research(topic: str):
-    """流式运行研报系统，逐步返回进度"""
+    """流式运行研报系统；同一主题已有在途执行时直接订阅它的进度"""
+    yield from research_flights.stream(normalize_text(topic), lambda cancel: _run_research(topic, cancel))
+
+
+def _run_research(topic: str, cancel: threading.Event):
+    """执行研报流水线，按固定帧率返回进度和报告（未变化的面板不重发）
+
+    cancel 被设置（所有订阅者都已离开）后，图内下一次节点 / 模型调用开始或下一个 token 到达时停止；
+    已完成的步骤留在检查点里，同一主题再次请求时从中断处继续。
+    """
     if not topic.strip():
         yield "⚠️ 请输入研究主题", ""
         return
 
-    progress_text = f"## 🚀 开始研究：{topic}\n\n"
-    report_text = ""
-
-    yield progress_text + "⏳ 正在启动研究流程...", report_text
-
-    # 使用 stream 模式逐步获取各节点的输出
-    for event in research_app.stream(
-        {"topic": topic, "revision_count": 0},
-        stream_mode="updates",
-    ):
-        for node_name, node_output in event.items():
-            # 更新进度
-            if "progress" in node_output:
-                for log in node_output["progress"]:
-                    progress_text += f"\n{log}\n"
+    cached = artifacts.get("report", topic, max_age=REPORT_CACHE_TTL)
+    if cached:
+        yield (f"## 📦 命中缓存：{topic}\n\n该主题的研报已于 {format_age(cached.age)}生成，直接返回缓存结果。\n\n"
+               "如需最新内容，可点击「🔄 后台刷新」。"), cached.value
+        return
 
-            # 更新报告
-            if "final_report" in node_output:
-                report_text = node_output["final_report"]
-            elif "draft" in node_output:
-                report_text = f"*（草稿 - 审核中...）*\n\n{node_output['draft']}"
+    progress = ProgressLog(f"## 🚀 开始研究：{topic}")
+    report_text = ""
+    live = LiveDraft({"writer": "✍️ Writer"})
+    frames = FrameThrottle()
+    first_token_logged = False
+
+    token = CancelToken(cancel)
+    config = {"configurable": {"thread_id": f"report:{normalize_text(topic)}"}, "callbacks": [token]}
+    inputs = initial_state(topic)
+    snapshot = research_app.get_state(config)
+    if snapshot.next:
+        # 从中断处继续：已完成步骤的耗时不再计入，预算按本次重新开始计时
+        research_app.update_state(config, {"started_at": inputs["started_at"]})
+        inputs = None
+        progress.add(f"♻️ 从上次中断处继续，已完成的步骤不再重跑（下一步：{', '.join(snapshot.next)}）")
+
+    yield frames.frame(progress.render("⏳ 正在启动研究流程..."), report_text, force=True)
+
+    # updates 提供节点级进度，messages 提供 Writer 的逐 token 输出，
+    # custom 提供子问题的起止，subgraphs=True 让 Researcher 内部 ReAct 的工具调用也实时可见
+    try:
+        for namespace, mode, data in research_app.stream(
+            inputs,
+            config,
+            stream_mode=["updates", "messages", "custom"],
+            subgraphs=True,
+        ):
+            if mode == "messages":
+                if not live.feed(*data):
+                    continue
+                if not first_token_logged:
+                    first_token_logged = True
+                    metrics.observe("ui.time_to_first_content", live.first_token_at, demo="08")
+                    progress.add(f"⏱️ 研报首字可见：{live.first_token_at:.2f}s")
+                # token 是高频事件，交给 FrameThrottle 合并
+                frame = frames.frame(progress.render(), live.render())
+                if frame:
+                    yield frame
+                continue
+
+            if mode == "custom":
+                progress.add(data["progress"])
+            elif namespace:
+                # 子图（ReAct Agent）的更新：只展示工具调用
+                calls = format_tool_calls(data)
+                if not calls:
+                    continue
+                progress.add(calls)
+            else:
+                for node_name, node_output in data.items():
+                    # 更新进度
+                    for log in node_output.get("progress", []):
+                        progress.add(log)
+
+                    # 更新报告
+                    if "final_report" in node_output:
+                        report_text = node_output["final_report"]
+                    elif "draft" in node_output:
+                        live.reset()
+                        report_text = f"*（草稿 - 审核中...）*\n\n{node_output['draft']}"
+
+            # 节点级事件频率低且之后可能长时间无事件，立即出帧
+            frame = frames.frame(progress.render(), live.render() or report_text, force=True)
+            if frame:
+                yield frame
+    except Cancelled:
+        # 没有订阅者了，这一帧不会被看到，只记录指标
+        saved = record_run("08", token, cancelled=True)
+        yield frames.frame(progress.render(f"\n---\n⏹️ **已取消**（估算节省 {saved} tokens）"), report_text, force=True)
+        return
 
-            yield progress_text, report_text
+    record_run("08", token, cancelled=False)
+    research_app.checkpointer.delete_thread(config["configurable"]["thread_id"])
 
     # 最终输出
     if not report_text or report_text.startswith("*（草稿"):
         report_text = "⚠️ 研报生成未完成，请重试。"
+    else:
+        artifacts.put("report", topic, report_text)
 
-    yield progress_text + "\n---\n🎉 **全部流程已完成！**", report_text
+    footer = f"\n---\n🎉 **全部流程已完成！**\n\n<small>📈 {structured_summary()}；{tool_cache_summary()}；{cancel_summary('08')}</small>"
+    yield frames.frame(progress.render(footer, full=True), report_text, force=True)
 
 
 with gr.Blocks(theme=gr.themes.Soft(), title="深度研报系统") as chat_ui:
-    gr.Markdown("# 📊 深度研报系统\n多 Agent 协作：Planner → Researcher → Analyst → Writer → Reviewer")
+    gr.Markdown("# 📊 深度研报系统\n多 Agent 协作：Planner → Researcher → Compressor → Analyst → Writer → Reviewer")
 
     with gr.Row():
         topic_input = gr.Textbox(
@@ -397,6 +879,8 @@ with gr.Blocks(theme=gr.themes.Soft(), title="深度研报系统") as chat_ui:
             scale=4
         )
         run_btn = gr.Button("🚀 生成研报", variant="primary", scale=1)
+        stop_btn = gr.Button("⏹️ 停止", variant="stop", scale=1)
+        refresh_btn = gr.Button("🔄 后台刷新", scale=1)
 
     with gr.Row():
         with gr.Column(scale=1):
@@ -404,12 +888,21 @@ with gr.Blocks(theme=gr.themes.Soft(), title="深度研报系统") as chat_ui:
         with gr.Column(scale=2):
             report_output = gr.Markdown(label="📄 研报内容", value="*研报将在这里显示...*")
 
-    run_btn.click(
+    run_event = run_btn.click(
         fn=run_research,
         inputs=[topic_input],
         outputs=[progress_output, report_output],
     )
 
+    # 停止 / 关闭页面都会关闭 run_research 生成器，进而取消图的运行
+    stop_btn.click(fn=None, cancels=[run_event])
+
+    refresh_btn.click(
+        fn=refresh_report,
+        inputs=[topic_input],
+        outputs=[progress_output],
+    )
+
     gr.Examples(
         examples=[
             "人工智能在医疗行业的应用前景",
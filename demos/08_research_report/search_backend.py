@@ -0,0 +1,57 @@
+"""Demo 08 的搜索后端
+
+搜索工具只负责参数和缓存，真正的查询交给这里的后端。默认使用本地的 FakeSearchBackend，
+无需网络即可运行；可用 latency 模拟外部 API 的延迟，calls 记录实际请求次数，便于验证缓存效果。
+
+接入真实搜索（Tavily / SerpAPI 等）时，实现同样的 web / academic / market 三个方法并替换 backend 即可。
+"""
+
+import threading
+import time
+from collections import Counter
+
+
+class FakeSearchBackend:
+    """离线的模拟搜索后端"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def _request(self, kind: str) -> None:
+        with self._lock:
+            self.calls[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def web(self, query: str) -> str:
+        self._request("web")
+        return (
+            f"【搜索结果 - {query}】\n"
+            f"1. 根据最新研究数据显示，{query}领域在2024-2025年呈现显著增长趋势，"
+            f"年均增长率约15-20%。\n"
+            f"2. 行业专家指出，{query}的核心驱动因素包括技术创新、政策支持和市场需求三个维度。\n"
+            f"3. 主要挑战包括：人才短缺、标准化不足、投资回报周期长等。\n"
+            f"4. 预计到2026年，该领域市场规模将达到当前的2-3倍。\n"
+            f"5. 领先企业已开始布局下一代技术路线，竞争格局正在重塑。"
+        )
+
+    def academic(self, query: str) -> str:
+        self._request("academic")
+        return (
+            f"【学术论文 - {query}】\n"
+            f"1. 《{query}的前沿进展与未来展望》(2025) - 综述了该领域最新理论框架和实证研究。\n"
+            f"2. 《基于数据驱动的{query}分析方法》(2024) - 提出了新的量化分析模型。\n"
+            f"3. 《{query}的国际比较研究》(2025) - 对比了中美欧三大市场的发展路径。"
+        )
+
+    def market(self, query: str) -> str:
+        self._request("market")
+        return (
+            f"【市场数据 - {query}】\n"
+            f"- 2024年市场规模：约 850 亿美元\n"
+            f"- 2025年预估市场规模：约 1020 亿美元（同比增长 20%）\n"
+            f"- 主要参与者市场份额：头部企业占比约 45%，中小企业占比 55%\n"
+            f"- 投融资情况：2024年全年融资事件超 200 起，总额约 150 亿美元"
+        )
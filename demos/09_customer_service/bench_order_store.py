@@ -0,0 +1,75 @@
+"""
+订单存储基准：百万级订单下的单条 / 批量 / 缓存查询延迟
+
+先用 order_store.generate 生成模拟订单（已有足够数据时跳过），再用多个线程随机查询：
+- get：按订单号单条查询（关闭读穿缓存，直接打到 SQLite 主键索引）
+- get_many：一次查询 --batch 个订单号（一条 IN 语句）
+- cached：热点订单反复查询，命中读穿缓存
+- tracking / user：按物流单号、用户 ID 走二级索引
+
+运行：
+    PYTHONPATH=. python demos/09_customer_service/bench_order_store.py --rows 1000000 --lookups 20000
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from order_store import OrderStore, generate
+from shared.metrics import percentile
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / ".cache" / "orders_bench.sqlite3"
+
+
+def measure(name: str, calls: list, threads: int) -> None:
+    def timed(call):
+        started = time.perf_counter()
+        call()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(timed, calls))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<10}{len(calls) / elapsed:>12,.0f}"
+          f"{percentile(latencies, 50) * 1e6:>10.0f}{percentile(latencies, 99) * 1e6:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=str(DEFAULT_PATH), help="基准用的 SQLite 文件")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="模拟订单数")
+    parser.add_argument("--lookups", type=int, default=20_000, help="每项查询的次数")
+    parser.add_argument("--batch", type=int, default=5, help="get_many 每次的订单数")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = OrderStore(args.path, cache_ttl=0)
+    if store.count() < args.rows:
+        started = time.perf_counter()
+        generate(store, args.rows, seed=args.seed)
+        print(f"生成 {args.rows:,} 笔订单：{time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(args.seed)
+    ids = [f"{1_000_000 + rng.randrange(args.rows)}" for _ in range(args.lookups)]
+    samples = store.get_many(ids[:1000])
+    trackings = [order["tracking"] for order in samples.values()]
+    users = [order["user_id"] for order in samples.values()]
+
+    cached = OrderStore(args.path)
+    hot = ids[:100]
+
+    print(f"{'query':<10}{'ops/sec':>12}{'p50 µs':>10}{'p99 µs':>10}")
+    measure("get", [lambda i=i: store.get(i) for i in ids], args.threads)
+    measure("get_many", [lambda i=i: store.get_many(ids[i:i + args.batch])
+                         for i in range(0, len(ids), args.batch)], args.threads)
+    measure("cached", [lambda i=i: cached.get(hot[i % len(hot)]) for i in range(args.lookups)], args.threads)
+    measure("tracking", [lambda t=t: store.find_by_tracking(t) for t in trackings], args.threads)
+    measure("user", [lambda u=u: store.find_by_user(u) for u in users], args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+客服路由回放基准：吞吐、延迟、意图准确率
+
+把带标注的 JSONL 数据集（每行 {"message": ..., "intent": ...}）通过 .batch() 并发回放，
+可以回放整张客服图（--target graph），也可以只回放 Router（--target router）。
+
+指标：
+- 吞吐（msgs/sec）和单条消息延迟的 p50 / p95 / p99
+- 各意图的混淆矩阵和准确率
+- 平均每条消息的 LLM 调用次数（含快速通道、追问、推测执行的影响）
+
+--fake 使用离线的关键词模型（不需要 API Key 和网络），--fake-latency 模拟每次模型调用的耗时；
+不加 --fake 时使用 main.py 中配置的真实模型。
+
+运行：
+    PYTHONPATH=. python demos/09_customer_service/bench_replay.py --fake --concurrency 8
+    PYTHONPATH=. python demos/09_customer_service/bench_replay.py --fake --target router --no-speculation
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from shared.metrics import percentile
+
+DEFAULT_DATASET = Path(__file__).resolve().parent / "replay_sample.jsonl"
+INTENTS = ["faq", "order", "tech_support", "complaint", "chitchat"]
+
+# 离线模型的分类规则：按顺序匹配，都不命中时判为 chitchat
+FAKE_RULES = [
+    ("complaint", ["投诉", "太差", "差评", "律师", "起诉", "气死", "失望"]),
+    ("tech_support", ["闪退", "登录", "卡顿", "打不开"]),
+    ("order", ["订单", "物流", "发货", "快递"]),
+    ("faq", ["退货", "换货", "发票", "优惠券", "会员", "包邮", "运费", "地址"]),
+]
+
+
+class FakeChatModel(BaseChatModel):
+    """离线的关键词模型：路由请求按 FAKE_RULES 分类，投诉返回 JSON，其余返回固定回复"""
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-keyword"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        system, user = messages[0].content, messages[-1].content
+        if "路由助手" in system:
+            text = next((intent for intent, words in FAKE_RULES if any(w in user for w in words)), "chitchat")
+        elif "投诉处理" in system:
+            text = json.dumps({"response": "非常抱歉给您带来不便。", "escalate": False}, ensure_ascii=False)
+        else:
+            text = "好的，已为您处理。"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class CallCounter(BaseCallbackHandler):
+    """统计聊天模型调用次数（挂在模型上，后台线程里的调用也能统计到）"""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, **kwargs: Any) -> None:
+        with self._lock:
+            self.calls += 1
+
+
+def load_dataset(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_confusion(labels: list[str], predictions: list[str]) -> None:
+    pairs = Counter(zip(labels, predictions))
+    width = max(len(i) for i in INTENTS) + 2
+    print("\n混淆矩阵（行：标注，列：预测）")
+    print(" " * width + "".join(f"{i:>{width}}" for i in INTENTS) + f"{'acc':>8}")
+    for label in INTENTS:
+        row = [pairs[(label, p)] for p in INTENTS]
+        total = labels.count(label)
+        acc = f"{pairs[(label, label)] / total:.0%}" if total else "-"
+        print(f"{label:<{width}}" + "".join(f"{n:>{width}}" for n in row) + f"{acc:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", type=Path, default=DEFAULT_DATASET, help="带标注的 JSONL 数据集")
+    parser.add_argument("--target", choices=["graph", "router"], default="graph")
+    parser.add_argument("--concurrency", type=int, default=8, help="batch 的 max_concurrency")
+    parser.add_argument("--repeat", type=int, default=1, help="数据集重复回放的次数")
+    parser.add_argument("--fake", action="store_true", help="使用离线的关键词模型")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="离线模型每次调用的耗时（秒）")
+    parser.add_argument("--no-speculation", action="store_true", help="关闭推测路由")
+    args = parser.parse_args()
+
+    if args.fake:
+        os.environ.setdefault("OPENAI_API_KEY", "offline")
+    import main as cs
+
+    if args.fake:
+        cs.llm = FakeChatModel(latency=args.fake_latency)
+    counter = CallCounter()
+    cs.llm.callbacks = [*(cs.llm.callbacks or []), counter]
+    cs.SPECULATIVE_ROUTING = not args.no_speculation and args.target == "graph"
+
+    def replay(message: str) -> dict:
+        started = time.perf_counter()
+        if args.target == "router":
+            result = cs.router_node(cs.new_turn(message))
+        else:
+            # 每条消息一个独立会话，互不影响追问判断；回放完即删除，不在 checkpointer 里堆积
+            thread_id = f"replay:{uuid.uuid4().hex}"
+            config = {"configurable": {"thread_id": thread_id}}
+            try:
+                result = cs.customer_service_app.invoke(cs.new_turn(message), config)
+            finally:
+                cs.customer_service_app.checkpointer.delete_thread(thread_id)
+        return {"intent": result["intent"], "latency": time.perf_counter() - started}
+
+    dataset = load_dataset(args.dataset) * args.repeat
+    started = time.perf_counter()
+    results = RunnableLambda(replay).batch([row["message"] for row in dataset],
+                                           {"max_concurrency": args.concurrency})
+    elapsed = time.perf_counter() - started
+
+    latencies = [r["latency"] for r in results]
+    labels = [row["intent"] for row in dataset]
+    predictions = [r["intent"] for r in results]
+    correct = sum(label == pred for label, pred in zip(labels, predictions))
+
+    print(f"目标：{args.target}，消息 {len(dataset)} 条，并发 {args.concurrency}，"
+          f"模型：{'离线关键词模型' if args.fake else '真实模型'}")
+    print(f"吞吐：{len(dataset) / elapsed:.1f} msgs/sec（总耗时 {elapsed:.2f}s）")
+    print(f"延迟：p50 {percentile(latencies, 50):.3f}s，p95 {percentile(latencies, 95):.3f}s，"
+          f"p99 {percentile(latencies, 99):.3f}s")
+    print(f"准确率：{correct / len(dataset):.1%}")
+    print(f"LLM 调用：{counter.calls} 次，平均每条 {counter.calls / len(dataset):.2f} 次")
+    if args.target == "graph" and not args.no_speculation:
+        print(cs.speculation_summary())
+    print_confusion(labels, predictions)
+
+
+if __name__ == "__main__":
+    main()
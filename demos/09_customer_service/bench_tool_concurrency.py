@@ -0,0 +1,76 @@
+"""
+ReAct 工具并行基准：同一轮的多个工具调用串行 vs 并行
+
+模型在一轮里同时发出多个工具调用（如 query_order + check_logistics，或 Researcher 的多个搜索）时，
+LangGraph 的 ToolNode 会用线程池并行执行，并按 config["max_concurrency"] 限制并行数，
+结果按调用顺序返回。这里用人为变慢的工具直接驱动 ToolNode，不需要模型和网络：
+- max_concurrency=1 等价于逐个执行
+- 逐步放开并行数，观察耗时和结果顺序
+
+运行：
+    PYTHONPATH=. python demos/09_customer_service/bench_tool_concurrency.py --calls 4 --latency 0.3
+"""
+
+import argparse
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.graph import START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+
+LATENCY = {"value": 0.3}
+
+
+@tool
+def query_order(order_id: str) -> str:
+    """查询订单（模拟慢接口）"""
+    time.sleep(LATENCY["value"])
+    return f"订单 {order_id}：已发货"
+
+
+@tool
+def check_logistics(tracking_number: str) -> str:
+    """查询物流（模拟慢接口）"""
+    time.sleep(LATENCY["value"])
+    return f"物流 {tracking_number}：派送中"
+
+
+def make_calls(n: int) -> AIMessage:
+    calls = []
+    for i in range(n):
+        if i % 2 == 0:
+            calls.append({"name": "query_order", "args": {"order_id": f"{10000 + i}"}, "id": f"call_{i}"})
+        else:
+            calls.append({"name": "check_logistics", "args": {"tracking_number": f"SF{i:010d}"}, "id": f"call_{i}"})
+    return AIMessage(content="", tool_calls=calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=4, help="同一轮中的工具调用数")
+    parser.add_argument("--latency", type=float, default=0.3, help="每个工具的模拟耗时（秒）")
+    args = parser.parse_args()
+    LATENCY["value"] = args.latency
+
+    # ToolNode 依赖图运行时注入的配置，放进一个只有工具节点的小图里执行
+    builder = StateGraph(MessagesState)
+    builder.add_node("tools", ToolNode([query_order, check_logistics]))
+    builder.add_edge(START, "tools")
+    graph = builder.compile()
+    message = make_calls(args.calls)
+    expected = [call["id"] for call in message.tool_calls]
+
+    print(f"{'max_concurrency':<17}{'seconds':>9}{'speedup':>9}  ordered")
+    baseline = None
+    for limit in sorted({1, 2, args.calls}):
+        started = time.perf_counter()
+        result = graph.invoke({"messages": [message]}, {"max_concurrency": limit})
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        ordered = [m.tool_call_id for m in result["messages"][1:]] == expected
+        print(f"{limit:<17}{elapsed:>9.2f}{baseline / elapsed:>8.1f}x  {ordered}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Demo 09 的本地升级评分
+
+Complaint Agent 原本要等 LLM 生成完整的安抚回复，才能从 JSON 的 escalate 字段得知是否升级人工。
+这里用词表和正则在本地给投诉打一个「需要升级」的分数，不调用模型，耗时在毫秒以内：
+
+- 情绪：强烈负面词、连续感叹号、催促
+- 法律威胁：律师、起诉、消协、12315、曝光等
+- 金额纠纷：退款、赔偿、多扣款、具体金额等
+- 可选的小分类器：在内置的少量标注样本上训练的朴素贝叶斯（字符 2-gram），作为额外证据
+
+各类证据按 noisy-OR 合成 0-1 的分数（任一类证据都能单独推高分数，多类叠加更高）。
+分数足够高时 Complaint Agent 直接走升级流程，不再等 LLM。
+"""
+
+import math
+import re
+from collections import Counter
+from typing import NamedTuple
+
+from shared.text import normalize_text
+
+# 各类证据：(名称, 正则, 权重)，每类只计一次
+SIGNALS = [
+    ("情绪激动", re.compile(r"气死|太差|垃圾|恶心|忍无可忍|受够|火大|什么破|骗子|无语|坑人|欺负人"), 0.35),
+    ("法律威胁", re.compile(r"律师|起诉|告你们|法院|消协|消费者协会|12315|工商|曝光|媒体|维权"), 0.6),
+    ("金额纠纷", re.compile(r"退款|赔偿|赔钱|多扣|扣款|乱收费|没退|少退|\d+\s*(元|块)"), 0.3),
+    ("语气强烈", re.compile(r"[!！]{2,}|马上|立刻|立即|必须"), 0.15),
+]
+# 分类器证据的最大权重
+CLASSIFIER_WEIGHT = 0.5
+
+# 分类器的内置训练样本：(文本, 是否应升级)
+EXAMPLES = [
+    ("你们就是骗子，我要去消协投诉", True),
+    ("再不退款我就找律师起诉你们", True),
+    ("多扣了我两百块钱，必须马上赔偿", True),
+    ("我要打12315举报你们乱收费", True),
+    ("气死我了，东西坏了客服还不理人，我要曝光", True),
+    ("忍无可忍了，三次都没给我退钱", True),
+    ("你们这什么破服务，我要找媒体", True),
+    ("退款一个月了还没到账，太欺负人了", True),
+    ("快递有点慢，希望改进一下", False),
+    ("包装有点破损，不过东西没坏", False),
+    ("客服回复有点慢", False),
+    ("商品颜色和图片不太一样", False),
+    ("希望下次能早点发货", False),
+    ("服务态度一般，体验不太好", False),
+    ("物流信息好久没更新了", False),
+    ("说明书写得不太清楚", False),
+]
+
+
+class EscalationScore(NamedTuple):
+    score: float           # 0-1，越高越应该升级
+    reasons: list[str]     # 命中的证据
+
+
+def _bigrams(text: str) -> list[str]:
+    text = normalize_text(text)
+    return [text[i:i + 2] for i in range(len(text) - 1)] or [text]
+
+
+class NaiveBayes:
+    """字符 2-gram 的二分类朴素贝叶斯（拉普拉斯平滑）"""
+
+    def __init__(self, examples: list[tuple[str, bool]]):
+        self.counts = {True: Counter(), False: Counter()}
+        self.docs = Counter(label for _, label in examples)
+        for text, label in examples:
+            self.counts[label].update(_bigrams(text))
+        self.vocab = len(set(self.counts[True]) | set(self.counts[False]))
+        self.totals = {label: sum(c.values()) for label, c in self.counts.items()}
+
+    def probability(self, text: str) -> float:
+        """文本属于「应升级」的后验概率"""
+        logits = {}
+        for label in (True, False):
+            log_p = math.log(self.docs[label] / sum(self.docs.values()))
+            for gram in _bigrams(text):
+                log_p += math.log((self.counts[label][gram] + 1) / (self.totals[label] + self.vocab))
+            logits[label] = log_p
+        return 1 / (1 + math.exp(logits[False] - logits[True]))
+
+
+_classifier = NaiveBayes(EXAMPLES)
+
+
+def score(message: str, use_classifier: bool = True) -> EscalationScore:
+    """本地计算升级分数"""
+    reasons, keep = [], 1.0
+    for name, pattern, weight in SIGNALS:
+        if pattern.search(message):
+            reasons.append(name)
+            keep *= 1 - weight
+    if use_classifier:
+        # 分类器只提供正向证据：概率高于 0.5 的部分按比例折算成权重
+        p = _classifier.probability(message)
+        weight = max(0.0, 2 * p - 1) * CLASSIFIER_WEIGHT
+        if weight > 0.05:
+            reasons.append(f"分类器 {p:.2f}")
+            keep *= 1 - weight
+    return EscalationScore(round(1 - keep, 3), reasons)
@@ -0,0 +1,121 @@
+"""Demo 09 的 FAQ 兜底答案缓存
+
+search_faq 查不到时 FAQ Agent 会让 LLM 生成答案；同一个知识库没覆盖的问题（如「怎么修改收货地址」）
+会被不同用户反复问到，每次都重新生成既慢又费钱。这里缓存 LLM 生成的答案：
+
+- 键是规范化后的问题（全半角、大小写、空白和标点差异视为同一问题）
+- 可选近似匹配：规范化后不完全相同时，用 shared.dedup 的 MinHash 相似度找最接近的已缓存问题
+- 每条记录有新鲜期（TTL），容量超限按 LRU 淘汰；可按问题手动失效，或整体清空
+- 记录命中次数，命中足够多的条目可以提升进 FAQ_KNOWLEDGE_BASE，之后直接由知识库回答
+- 命中（精确 / 近似）、未命中次数记录在 shared.metrics 中
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from shared.dedup import signature, similarity
+from shared.metrics import metrics
+from shared.text import normalize_text
+
+# 默认新鲜期（秒）和容量（条）
+TTL = 24 * 3600
+MAX_ENTRIES = 1000
+# 近似匹配的字符 n-gram 长度：问题都很短，用 2-gram
+SHINGLE_K = 2
+
+
+@dataclass
+class CachedAnswer:
+    question: str                  # 第一次被问到时的原始问题
+    answer: str
+    created_at: float
+    signature: tuple[int, ...]
+    hits: int = 0
+
+
+class FAQAnswerCache:
+    """LLM 生成的 FAQ 答案缓存，线程安全"""
+
+    def __init__(self, ttl: float = TTL, maxsize: int = MAX_ENTRIES, threshold: float | None = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # 近似匹配的相似度阈值；None 时只做精确（规范化后）匹配
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, CachedAnswer] = OrderedDict()
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return time.time() - entry.created_at > self.ttl
+
+    def _find(self, question: str) -> tuple[str, CachedAnswer | None, str]:
+        """查找问题对应的条目，返回 (键, 条目, 匹配方式)；调用方需持有锁"""
+        key = normalize_text(question)
+        match, kind = self._entries.get(key), "exact"
+        if match is None and self.threshold is not None:
+            sig = signature(question, SHINGLE_K)
+            best = max(
+                ((similarity(sig, entry.signature), k) for k, entry in self._entries.items()),
+                default=(0.0, None),
+            )
+            if best[0] >= self.threshold:
+                key, match, kind = best[1], self._entries[best[1]], "near"
+        return key, match, kind
+
+    def peek(self, question: str) -> CachedAnswer | None:
+        """只读查询：不计命中次数、不调整 LRU 顺序、不记指标（推测执行时使用）"""
+        with self._lock:
+            _, match, _ = self._find(question)
+            return None if match is None or self._expired(match) else match
+
+    def get(self, question: str) -> CachedAnswer | None:
+        with self._lock:
+            key, match, kind = self._find(question)
+            if match is not None and self._expired(match):
+                del self._entries[key]
+                match = None
+            if match is not None:
+                match.hits += 1
+                self._entries.move_to_end(key)
+
+        if match is None:
+            metrics.incr("faq_cache.misses")
+        else:
+            metrics.incr("faq_cache.hits", match=kind)
+        return match
+
+    def put(self, question: str, answer: str) -> None:
+        entry = CachedAnswer(question.strip(), answer, time.time(), signature(question, SHINGLE_K))
+        with self._lock:
+            self._entries[normalize_text(question)] = entry
+            self._entries.move_to_end(normalize_text(question))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, question: str | None = None) -> int:
+        """失效一个问题的缓存答案；不给问题时清空全部。返回删除的条数"""
+        with self._lock:
+            if question is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            return 1 if self._entries.pop(normalize_text(question), None) else 0
+
+    def popular(self, min_hits: int) -> list[CachedAnswer]:
+        """命中次数达到 min_hits 的新鲜条目，按命中次数从高到低"""
+        with self._lock:
+            entries = [e for e in self._entries.values() if e.hits >= min_hits and not self._expired(e)]
+        return sorted(entries, key=lambda e: e.hits, reverse=True)
+
+    def promote(self, knowledge_base: dict[str, str], min_hits: int) -> list[str]:
+        """把热门条目写进知识库（以原始问题为关键词）并移出缓存，返回被提升的问题"""
+        promoted = []
+        for entry in self.popular(min_hits):
+            knowledge_base[entry.question] = entry.answer
+            self.invalidate(entry.question)
+            promoted.append(entry.question)
+        return promoted
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -13,12 +13,18 @@ Demo 09: 智能客服系统 (Customer Service System)
 图结构：
   START → router → [faq / order / tech_support / complaint / chitchat]
                       ↓
-                   qa_inspector → END (or escalate_to_human)
+                   qa_inspector (or escalate_to_human) → remember → END
+
+对话按用户（会话）保存在 checkpointer 中：remember 节点维护上一轮意图、提到过的订单号和
+精简的对话摘要，追问（如「那什么时候到？」）沿用上一轮意图，不再调用 LLM 分类。
 """
 
 import os
-import json
-from typing import TypedDict, Annotated, Literal
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, TypedDict, Annotated, Literal
 from shared import setup
 
 import gradio as gr
@@ -27,6 +33,16 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import tool
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import create_react_agent
+from shared.cancel import Cancelled
+from shared.checkpoint import PruningSaver
+from shared.metrics import metrics
+from shared.structured import stream_json
+from shared.text import normalize_text
+from shared.toolguard import tool_guard
+
+import escalation
+from faq_cache import FAQAnswerCache
+from order_store import OrderStore
 
 setup()
 
@@ -34,6 +50,31 @@ setup()
 
 llm = init_chat_model("openai:gpt-5.2", temperature=0)
 
+# 订单 / 物流查询的超时（秒）：背后是外部系统，超时返回「工具不可用」，Agent 据此安抚用户而不是卡住
+ORDER_TOOL_TIMEOUT = 3
+LOGISTICS_TOOL_TIMEOUT = 5
+# Order Agent 同一轮发出多个工具调用（如 query_order + check_logistics）时的最大并行数
+ORDER_TOOL_CONCURRENCY = 2
+# 订单查询快速通道是否再用一次 LLM 润色模板回复（False 时直接返回模板，零 LLM 调用）
+ORDER_FAST_PATH_SUMMARY = False
+# FAQ 兜底答案缓存：新鲜期（秒）、近似匹配阈值（None 只做精确匹配）、命中多少次后可提升进知识库
+FAQ_CACHE_TTL = 24 * 3600
+FAQ_CACHE_THRESHOLD = 0.7
+FAQ_PROMOTE_HITS = 5
+# 多轮对话：摘要保留最近几轮、每轮截取多少字，记住最近几个订单号
+SUMMARY_TURNS = 4
+SUMMARY_CHARS = 40
+MAX_REMEMBERED_ORDERS = 5
+# 不超过这么多字（规范化后）的追问才考虑沿用上一轮意图
+FOLLOW_UP_MAX_CHARS = 15
+# 推测执行：LLM 路由期间，先按规则或上一轮意图启动最可能的专业 Agent，路由结果一致就直接采用
+SPECULATIVE_ROUTING = True
+# 本地升级评分（见 escalation.py）达到该值时直接升级人工，不等 LLM；None 关闭短路
+ESCALATION_SHORT_CIRCUIT = 0.75
+# LLM 回复解析失败时，本地评分达到该值也升级
+ESCALATION_FALLBACK = 0.5
+ESCALATION_CLASSIFIER = True
+
 
 # ======================== State 定义 ========================
 
@@ -45,6 +86,25 @@ class CustomerServiceState(TypedDict):
     qa_passed: bool                # 是否通过质检
     escalated: bool                # 是否升级人工
     debug_info: list[str]          # 调试信息（节点流转日志）
+    # 以下字段跨轮保留（checkpointer 按 thread_id 保存）
+    last_intent: str               # 上一轮的意图
+    order_ids: list[str]           # 最近提到的订单号
+    summary: str                   # 精简的对话摘要（最近几轮）
+    speculated: dict               # Router 推测执行命中时，专业 Agent 已经算好的输出
+
+
+def new_turn(message: str) -> dict:
+    """新一轮的输入：重置只属于单轮的字段，跨轮字段由 checkpointer 保留"""
+    return {
+        "user_message": message,
+        "intent": "",
+        "response": "",
+        "qa_result": "",
+        "qa_passed": False,
+        "escalated": False,
+        "debug_info": [],
+        "speculated": {},
+    }
 
 
 # ======================== 模拟知识库和数据 ========================
@@ -60,23 +120,11 @@ FAQ_KNOWLEDGE_BASE = {
 }
 
 
-# 订单数据库（模拟）
-ORDER_DATABASE = {
-    "12345": {
-        "status": "已发货",
-        "tracking": "SF1234567890",
-        "items": ["无线耳机 x1", "手机壳 x2"],
-        "total": 299.0,
-        "estimated_delivery": "2026-02-18"
-    },
-    "67890": {
-        "status": "配送中",
-        "tracking": "YT9876543210",
-        "items": ["运动手表 x1"],
-        "total": 799.0,
-        "estimated_delivery": "2026-02-16"
-    },
-}
+# 知识库没覆盖、由 LLM 生成的答案（见 faq_cache.py）
+faq_answers = FAQAnswerCache(ttl=FAQ_CACHE_TTL, threshold=FAQ_CACHE_THRESHOLD)
+
+# 订单 / 物流数据在本地 SQLite 中（见 order_store.py）— 实际项目中可替换为业务系统 API
+order_store = OrderStore()
 
 
 # ======================== 工具函数 ========================
@@ -84,51 +132,61 @@ ORDER_DATABASE = {
 @tool
 def search_faq(query: str) -> str:
     """搜索 FAQ 知识库。输入用户问题关键词，返回相关答案。"""
-    # 简单关键词匹配（实际项目中应使用向量相似度搜索）
+    # 简单关键词匹配（实际项目中应使用向量相似度搜索）；规范化后比较，提升进来的整句问题也能匹配
+    query = normalize_text(query)
     for keyword, answer in FAQ_KNOWLEDGE_BASE.items():
-        if keyword in query:
+        if normalize_text(keyword) in query:
             return f"【FAQ】{answer}"
     return "【FAQ】抱歉，暂未找到相关答案。您可以详细描述问题，我将为您人工解答。"
 
 
+def format_order(order: dict) -> str:
+    return (
+        f"【订单详情】\n"
+        f"订单号：{order['order_id']}\n"
+        f"状态：{order['status']}\n"
+        f"物流单号：{order['tracking']}（{order['carrier']}）\n"
+        f"商品：{', '.join(order['items'])}\n"
+        f"金额：¥{order['total']}\n"
+        f"预计送达：{order['estimated_delivery']}"
+    )
+
+
+ORDER_NOT_FOUND = "【订单查询】未找到订单 {}，请确认订单号是否正确。"
+
+
 @tool
+@tool_guard(timeout=ORDER_TOOL_TIMEOUT)
 def query_order(order_id: str) -> str:
     """查询订单状态和物流信息。输入订单号，返回订单详情。"""
-    order = ORDER_DATABASE.get(order_id)
+    order = order_store.get(order_id)
     if order:
-        return (
-            f"【订单详情】\n"
-            f"订单号：{order_id}\n"
-            f"状态：{order['status']}\n"
-            f"物流单号：{order['tracking']}\n"
-            f"商品：{', '.join(order['items'])}\n"
-            f"金额：¥{order['total']}\n"
-            f"预计送达：{order['estimated_delivery']}"
-        )
-    return "【订单查询】未找到该订单，请确认订单号是否正确。"
+        return format_order(order)
+    return ORDER_NOT_FOUND.format(order_id)
+
+
+@tool
+@tool_guard(timeout=ORDER_TOOL_TIMEOUT)
+def query_orders(order_ids: list[str]) -> str:
+    """批量查询多个订单。用户一次提到多个订单号时使用，输入订单号列表，返回每个订单的详情。"""
+    orders = order_store.get_many(order_ids)
+    return "\n\n".join(
+        format_order(orders[order_id]) if order_id in orders else ORDER_NOT_FOUND.format(order_id)
+        for order_id in dict.fromkeys(order_ids)
+    )
 
 
 @tool
+@tool_guard(timeout=LOGISTICS_TOOL_TIMEOUT, hedge=True)
 def check_logistics(tracking_number: str) -> str:
     """查询物流信息。输入物流单号，返回物流轨迹。"""
-    # 模拟物流查询
-    if tracking_number.startswith("SF"):
-        return (
-            f"【物流信息】\n"
-            f"单号：{tracking_number}\n"
-            f"2026-02-15 10:30 [深圳转运中心] 快件已到达\n"
-            f"2026-02-15 14:20 [深圳] 派送中，预计今日送达\n"
-            f"2026-02-15 16:45 [深圳] 快件已签收"
-        )
-    elif tracking_number.startswith("YT"):
-        return (
-            f"【物流信息】\n"
-            f"单号：{tracking_number}\n"
-            f"2026-02-14 18:00 [上海仓库] 已发货\n"
-            f"2026-02-15 09:15 [杭州转运中心] 运输中\n"
-            f"2026-02-16 预计送达"
-        )
-    return "【物流查询】未找到物流信息，请确认单号是否正确。"
+    result = order_store.logistics(tracking_number.upper())
+    if result is None:
+        return "【物流查询】未找到物流信息，请确认单号是否正确。"
+    carrier, events = result
+    lines = [f"【物流信息】", f"单号：{tracking_number.upper()}（{carrier}）"]
+    lines += [f"{time} [{location}] {event}" if location else f"{time} {event}" for time, location, event in events]
+    return "\n".join(lines)
 
 
 @tool
@@ -147,12 +205,187 @@ def diagnose_issue(issue_description: str) -> str:
         return "【诊断建议】请提供更详细的问题描述，包括：1) 具体错误提示 2) 操作步骤 3) 设备型号和系统版本"
 
 
+# ======================== 订单查询快速通道 ========================
+
+# 订单号为 5 位以上的纯数字，物流单号为 2 位快递公司前缀 + 10 位数字
+ORDER_ID_PATTERN = re.compile(r"(?<![0-9A-Za-z])\d{5,}(?![0-9])")
+TRACKING_PATTERN = re.compile(r"(?<![0-9A-Za-z])([A-Za-z]{2}\d{10})(?![0-9])")
+# 1 开头的 11 位数字是手机号，不当作订单号
+PHONE_PATTERN = re.compile(r"1\d{10}")
+# 明确是「查一下」的说法：只有名词（订单、快递）不算，「订单 12345 的快递能加急吗」不是查询
+QUERY_PHRASES = ["查询", "查一下", "查下", "查查", "看一下", "到哪了", "到哪里了", "到哪儿了", "什么时候到",
+                 "物流信息", "物流状态", "订单状态", "订单详情"]
+# 查询句里可以出现的其他字词；去掉单号、查询说法和这些字词后还剩内容，说明另有诉求，交给完整流程
+LOOKUP_FILLERS = ["你好", "您好", "麻烦", "帮忙", "帮我", "请", "我的", "我", "那个", "那", "它", "现在",
+                  "一下", "订单号", "订单", "物流单号", "快递单号", "运单号", "单号", "物流", "快递",
+                  "和", "跟", "还有", "以及", "的", "了", "吗", "呢", "啊"]
+LOGISTICS_HINTS = ["物流", "快递", "到哪", "送达", "派送", "什么时候到"]
+
+
+def extract_order_ids(message: str) -> list[str]:
+    # 先去掉物流单号再找订单号，避免把单号里的数字当成订单号
+    numbers = ORDER_ID_PATTERN.findall(TRACKING_PATTERN.sub(" ", message))
+    return list(dict.fromkeys(n for n in numbers if not PHONE_PATTERN.fullmatch(n)))
+
+
+def _is_plain_lookup(message: str) -> bool:
+    """消息是否只由单号、查询说法和 LOOKUP_FILLERS 组成"""
+    if not any(phrase in message for phrase in QUERY_PHRASES):
+        return False
+    rest = ORDER_ID_PATTERN.sub(" ", TRACKING_PATTERN.sub(" ", message))
+    for word in sorted(QUERY_PHRASES + LOOKUP_FILLERS, key=len, reverse=True):
+        rest = rest.replace(word, " ")
+    return not normalize_text(rest)
+
+
+class OrderLookup(NamedTuple):
+    """从消息中确定性抽取出的查询请求"""
+    order_ids: list[str]
+    tracking_numbers: list[str]
+    wants_logistics: bool
+
+
+def match_order_lookup(message: str, known_order_ids: list[str] = ()) -> OrderLookup | None:
+    """消息是明确的订单 / 物流查询时返回抽取结果，否则返回 None（交给 LLM 路由和 ReAct Agent）。
+
+    明确的查询要有查询说法（「查一下」「到哪了」「物流信息」等），且除单号和客套字词外没有别的内容；
+    known_order_ids 是对话中已提到的订单号：追问里没有单号但在问物流时（「那什么时候到？」），沿用最近的订单。
+    """
+    if not _is_plain_lookup(message):
+        return None
+    tracking_numbers = list(dict.fromkeys(t.upper() for t in TRACKING_PATTERN.findall(message)))
+    order_ids = extract_order_ids(message)
+    wants_logistics = bool(tracking_numbers) or any(hint in message for hint in LOGISTICS_HINTS)
+    if not order_ids and not tracking_numbers:
+        if known_order_ids and wants_logistics:
+            return OrderLookup([known_order_ids[-1]], [], True)
+        return None
+    return OrderLookup(order_ids, tracking_numbers, wants_logistics)
+
+
+def order_fast_path(lookup: OrderLookup) -> str:
+    """直接调用查询工具并按模板拼出回复，不经过 ReAct 循环"""
+    sections = []
+    tracking_numbers = list(lookup.tracking_numbers)
+    if lookup.order_ids:
+        # 多个订单号一次批量查询
+        sections.append(query_orders.invoke({"order_ids": lookup.order_ids}))
+        if lookup.wants_logistics:
+            orders = order_store.get_many(lookup.order_ids)
+            tracking_numbers += [orders[o]["tracking"] for o in lookup.order_ids
+                                 if o in orders and orders[o]["tracking"] not in tracking_numbers]
+    if lookup.wants_logistics:
+        sections += [check_logistics.invoke({"tracking_number": t}) for t in tracking_numbers]
+    return "为您查询到以下信息：\n\n" + "\n\n".join(sections) + "\n\n如还有其他问题，请随时告诉我。"
+
+
+# ======================== 多轮对话 ========================
+
+# 各意图的强信号词：出现其他意图的信号时说明用户换了话题，不能沿用上一轮意图
+INTENT_HINTS = {
+    "faq": list(FAQ_KNOWLEDGE_BASE),
+    "order": ["订单", "物流", "快递", "发货"],
+    "tech_support": ["闪退", "崩溃", "登录", "登陆", "卡顿", "报错", "打不开"],
+    "complaint": ["投诉", "太差", "垃圾", "骗子", "差评", "赔偿"],
+}
+# 追问的常见说法
+FOLLOW_UP_MARKERS = ["那", "还", "呢", "它", "这个", "那个", "什么时候", "多久", "然后", "怎么办", "为什么", "可以吗"]
+
+
+def rule_intent(message: str) -> str | None:
+    """按信号词粗判意图；没有信号或信号指向多个意图时返回 None"""
+    matched = {intent for intent, hints in INTENT_HINTS.items() if any(hint in message for hint in hints)}
+    return matched.pop() if len(matched) == 1 else None
+
+
+def is_follow_up(message: str, last_intent: str) -> bool:
+    """简短、带追问语气、且没有指向其他意图的消息，视为对上一轮话题的追问"""
+    if not last_intent or last_intent == "chitchat":
+        return False
+    if len(normalize_text(message)) > FOLLOW_UP_MAX_CHARS:
+        return False
+    if rule_intent(message) not in (None, last_intent):
+        return False
+    return any(marker in message for marker in FOLLOW_UP_MARKERS)
+
+
+def context_messages(state: CustomerServiceState) -> list:
+    """把对话摘要作为上下文交给需要 LLM 的 Agent"""
+    lines = []
+    if state.get("summary"):
+        lines.append(f"之前的对话：\n{state['summary']}")
+    if state.get("order_ids"):
+        lines.append(f"用户提到过的订单号：{', '.join(state['order_ids'])}")
+    return [SystemMessage(content="\n".join(lines))] if lines else []
+
+
 # ======================== Agent 节点 ========================
 
 def router_node(state: CustomerServiceState) -> dict:
     """Router Agent: 识别用户意图，路由到对应 Agent"""
     user_message = state["user_message"]
 
+    # 明确的订单查询由规则直接识别，省掉一次 LLM 调用
+    if match_order_lookup(user_message):
+        return {
+            "intent": "order",
+            "debug_info": ["🎯 Router 规则命中: order（跳过 LLM 分类）"]
+        }
+
+    # 追问沿用上一轮意图，同样不调用 LLM
+    last_intent = state.get("last_intent", "")
+    if is_follow_up(user_message, last_intent):
+        return {
+            "intent": last_intent,
+            "debug_info": [f"🎯 Router 延续上一轮意图: {last_intent}（跳过 LLM 分类）"]
+        }
+
+    # 规则没法确定时才需要 LLM 分类；分类期间推测执行最可能的专业 Agent（副作用暂缓，命中后才生效）
+    candidate = rule_intent(user_message) or last_intent or None
+    speculation = spec = None
+    if SPECULATIVE_ROUTING and candidate:
+        spec = Speculation()
+        speculation = _speculation_pool.submit(_timed, SPECIALISTS[candidate], {**state, "intent": candidate}, spec)
+
+    started = time.monotonic()
+    intent = classify_intent(user_message)
+    router_latency = time.monotonic() - started
+
+    if speculation is None:
+        return {
+            "intent": intent,
+            "debug_info": [f"🎯 Router 识别意图: {intent}"]
+        }
+    if intent != candidate:
+        # 推测错误：取消推测执行（在下一次 LLM 调用 / 下一段输出处停下），丢弃它暂缓的副作用
+        spec.discard()
+        metrics.incr("speculation.misses", intent=candidate)
+        return {
+            "intent": intent,
+            "debug_info": [f"🎯 Router 识别意图: {intent}（推测 {candidate} 未命中，已丢弃）"]
+        }
+    try:
+        result, latency = speculation.result()
+    except Exception:
+        spec.discard()
+        metrics.incr("speculation.errors", intent=candidate)
+        return {
+            "intent": intent,
+            "debug_info": [f"🎯 Router 识别意图: {intent}（推测执行出错，重新执行）"]
+        }
+    # 命中：补上推测执行期间暂缓的缓存写入、命中计数和指标；与路由并行的那段时间就是省下的延迟
+    spec.apply()
+    metrics.incr("speculation.hits", intent=candidate)
+    metrics.observe("speculation.saved", min(router_latency, latency), intent=candidate)
+    return {
+        "intent": intent,
+        "speculated": result,
+        "debug_info": [f"🎯 Router 识别意图: {intent}（推测执行命中）"]
+    }
+
+
+def classify_intent(user_message: str) -> str:
+    """LLM 意图分类"""
     response = llm.invoke([
         SystemMessage(content="""你是一位智能客服路由助手，负责识别用户意图并分类。
 
@@ -172,56 +405,179 @@ def router_node(state: CustomerServiceState) -> dict:
     valid_intents = ["faq", "order", "tech_support", "complaint", "chitchat"]
     if intent not in valid_intents:
         intent = "chitchat"  # 默认兜底
+    return intent
 
-    return {
-        "intent": intent,
-        "debug_info": [f"🎯 Router 识别意图: {intent}"]
-    }
+
+# 推测执行专业 Agent 的线程池
+_speculation_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculation")
+
+
+class Speculation:
+    """一次推测执行：副作用先记下来，命中（apply）后才执行；落选（discard）时丢弃副作用并取消执行"""
+
+    def __init__(self):
+        self.cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._effects: list = []
+        self._state = "pending"
+
+    def defer(self, effect, *args, **kwargs) -> None:
+        with self._lock:
+            if self._state == "pending":
+                self._effects.append((effect, args, kwargs))
+                return
+            applied = self._state == "applied"
+        # 有结论之后才产生的副作用（如后台线程收尾时的指标）：命中了直接执行，落选了丢弃
+        if applied:
+            effect(*args, **kwargs)
+
+    def apply(self) -> None:
+        with self._lock:
+            self._state, effects, self._effects = "applied", self._effects, []
+        for effect, args, kwargs in effects:
+            effect(*args, **kwargs)
+
+    def discard(self) -> None:
+        with self._lock:
+            self._state, self._effects = "discarded", []
+        self.cancel.set()
+
+    def check(self) -> None:
+        if self.cancel.is_set():
+            raise Cancelled()
+
+
+def side_effect(spec: Speculation | None, effect, *args, **kwargs) -> None:
+    """专业 Agent 的缓存写入、命中计数和指标都经过这里：正常执行时立即生效，推测执行时等有了结论再说"""
+    if spec is None:
+        effect(*args, **kwargs)
+    else:
+        spec.defer(effect, *args, **kwargs)
+
+
+def llm_reply(messages: list, spec: Speculation | None = None) -> str:
+    """调用 LLM 生成回复；推测执行时改为流式，被取消后在下一段输出到达时关闭请求"""
+    if spec is None:
+        return llm.invoke(messages).content
+    spec.check()
+    text = ""
+    stream = llm.stream(messages)
+    try:
+        for chunk in stream:
+            spec.check()
+            text += chunk.content
+    finally:
+        stream.close()
+    return text
+
+
+def run_agent(agent, inputs: dict, config: dict | None = None, spec: Speculation | None = None) -> dict:
+    """运行 ReAct Agent；推测执行时逐步运行，被取消后不再进入下一步（模型调用 / 工具调用）"""
+    if spec is None:
+        return agent.invoke(inputs, config)
+    spec.check()
+    result = None
+    stream = agent.stream(inputs, config, stream_mode="values")
+    try:
+        for result in stream:
+            spec.check()
+    finally:
+        stream.close()
+    return result
 
 
-def faq_agent_node(state: CustomerServiceState) -> dict:
+def _timed(node, state: CustomerServiceState, spec: Speculation) -> tuple[dict, float]:
+    started = time.monotonic()
+    return node(state, spec), time.monotonic() - started
+
+
+def with_speculation(node):
+    """专业 Agent 节点的包装：Router 推测执行命中时直接采用已算好的输出"""
+    def run(state: CustomerServiceState) -> dict:
+        if state.get("speculated"):
+            return state["speculated"]
+        return node(state)
+    run.__name__ = node.__name__
+    return run
+
+
+def faq_agent_node(state: CustomerServiceState, spec: Speculation | None = None) -> dict:
     """FAQ Agent: 基于知识库回答常见问题"""
     user_message = state["user_message"]
 
     # 先尝试从知识库搜索
     faq_result = search_faq.invoke({"query": user_message})
 
-    # 如果找到答案，直接返回；否则用 LLM 生成回复
-    if "暂未找到" not in faq_result:
+    # 如果找到答案，直接返回；否则先查 LLM 答案缓存，仍未命中才用 LLM 生成回复
+    # 推测执行时只读缓存（peek）：计入命中 / 未命中的那次 get 和答案写入都等推测命中后再执行
+    found = "暂未找到" not in faq_result
+    cached = None
+    if not found and spec is None:
+        cached = faq_answers.get(user_message)
+    elif not found:
+        cached = faq_answers.peek(user_message)
+        spec.defer(faq_answers.get, user_message)
+
+    if found:
         response_text = faq_result
+    elif cached:
+        response_text = cached.answer
     else:
-        llm_response = llm.invoke([
+        response_text = llm_reply([
             SystemMessage(content="""你是专业的客服 FAQ 专员。请根据用户问题，提供清晰准确的回答。
 如果问题不在知识范围内，请礼貌告知用户可以转接人工客服。"""),
             HumanMessage(content=user_message)
-        ])
-        response_text = llm_response.content
+        ], spec)
+        side_effect(spec, faq_answers.put, user_message, response_text)
 
     return {
         "response": response_text,
-        "debug_info": [f"💬 FAQ Agent 已回复"]
+        "debug_info": [f"💬 FAQ Agent 已回复（缓存答案，原问题「{cached.question}」）" if cached
+                       else "💬 FAQ Agent 已回复"]
     }
 
 
-def order_agent_node(state: CustomerServiceState) -> dict:
+def order_agent_node(state: CustomerServiceState, spec: Speculation | None = None) -> dict:
     """Order Agent: 处理订单查询（带工具调用）"""
     user_message = state["user_message"]
 
+    # 快速通道：订单号 / 物流单号明确时直接查表，模板回复；有歧义的消息才进入 ReAct 循环
+    lookup = match_order_lookup(user_message, state.get("order_ids", []))
+    if lookup:
+        side_effect(spec, metrics.incr, "order.fast_path")
+        response_text = order_fast_path(lookup)
+        if ORDER_FAST_PATH_SUMMARY:
+            response_text = llm_reply([
+                SystemMessage(content="你是专业的订单查询客服。请根据查询结果，用简洁友好的语气回复用户，不要编造结果中没有的信息。"),
+                HumanMessage(content=f"用户问题：{user_message}\n\n查询结果：\n{response_text}"),
+            ], spec)
+        return {
+            "response": response_text,
+            "debug_info": [f"⚡ Order Agent 快速通道: 订单 {', '.join(lookup.order_ids) or '-'}"
+                           f"{'，含物流' if lookup.wants_logistics else ''}（跳过 ReAct）"]
+        }
+    side_effect(spec, metrics.incr, "order.fallback")
+
     # 创建 ReAct Agent，自动决定调用哪些工具
     order_agent = create_react_agent(
         model=llm,
-        tools=[query_order, check_logistics],
+        tools=[query_order, query_orders, check_logistics],
         prompt=(
             "你是专业的订单查询客服。请根据用户问题，使用订单查询工具获取信息。"
-            "如果用户提到订单号，优先使用 query_order 工具。"
+            "如果用户提到订单号，优先使用 query_order 工具；提到多个订单号时使用 query_orders 一次查完。"
             "如果涉及物流，使用 check_logistics 工具。"
+            "已知订单号和物流单号时，在同一轮中同时调用这两个工具，它们会被并行执行。"
             "回复要简洁友好，直接给出查询结果。"
         ),
     )
 
-    result = order_agent.invoke({
-        "messages": [HumanMessage(content=user_message)]
-    })
+    # 同一轮的多个工具调用由 ToolNode 并行执行，结果按调用顺序返回
+    result = run_agent(
+        order_agent,
+        {"messages": context_messages(state) + [HumanMessage(content=user_message)]},
+        {"max_concurrency": ORDER_TOOL_CONCURRENCY},
+        spec,
+    )
 
     final_response = result["messages"][-1].content
 
@@ -231,7 +587,7 @@ def order_agent_node(state: CustomerServiceState) -> dict:
     }
 
 
-def tech_support_agent_node(state: CustomerServiceState) -> dict:
+def tech_support_agent_node(state: CustomerServiceState, spec: Speculation | None = None) -> dict:
     """Tech Support Agent: 技术支持诊断（ReAct + 多轮引导）"""
     user_message = state["user_message"]
 
@@ -245,9 +601,9 @@ def tech_support_agent_node(state: CustomerServiceState) -> dict:
         ),
     )
 
-    result = tech_agent.invoke({
-        "messages": [HumanMessage(content=user_message)]
-    })
+    result = run_agent(tech_agent, {
+        "messages": context_messages(state) + [HumanMessage(content=user_message)]
+    }, spec=spec)
 
     final_response = result["messages"][-1].content
 
@@ -257,12 +613,19 @@ def tech_support_agent_node(state: CustomerServiceState) -> dict:
     }
 
 
-def complaint_agent_node(state: CustomerServiceState) -> dict:
-    """Complaint Agent: 处理投诉（情感分析 + 升级判断）"""
-    user_message = state["user_message"]
+COMPLAINT_SCHEMA = {
+    "title": "complaint_reply",
+    "type": "object",
+    "properties": {
+        "response": {"type": "string", "description": "向用户的回复内容（表达歉意 + 解决方案）"},
+        "escalate": {"type": "boolean"},
+        "reason": {"type": "string", "description": "升级原因（如果需要升级）"},
+    },
+    "required": ["response", "escalate"],
+}
 
-    response = llm.invoke([
-        SystemMessage(content="""你是专业的投诉处理专员。请用同理心回应用户的不满，并提供解决方案。
+
+COMPLAINT_PROMPT = """你是专业的投诉处理专员。请用同理心回应用户的不满，并提供解决方案。
 
 回复格式 JSON：
 {
@@ -276,27 +639,74 @@ escalate 规则：
 - 涉及金额纠纷、法律威胁 → true
 - 普通抱怨、可直接处理的问题 → false
 
-只返回 JSON，不要其他内容。"""),
-        HumanMessage(content=user_message)
-    ])
+只返回 JSON，不要其他内容。"""
+
+ESCALATION_REPLY = "非常抱歉给您带来这么糟糕的体验，您反映的问题我们非常重视。"
+ESCALATION_NOTICE = "\n\n由于您的情况较为特殊，我已为您转接人工客服，稍后将有专人为您处理。"
+
+# 投诉回复生成的线程池：与本地升级评分并行
+_complaint_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="complaint")
+
+
+def _complaint_reply(messages: list, cancel: threading.Event, spec: Speculation | None) -> dict | None:
+    """流式生成投诉回复；cancel 被设置时关闭流式请求（也不再发起修正重试）并返回 None"""
+    stream = stream_json(llm, messages, COMPLAINT_SCHEMA, name="complaint", cancel=cancel)
+    try:
+        for partial in stream:
+            if partial.done:
+                return partial.value
+    finally:
+        stream.close()
+    # 流式输出只有被取消时才会在最终结果之前结束
+    side_effect(spec, metrics.incr, "escalation.llm_aborted")
+    return None
+
+
+def complaint_agent_node(state: CustomerServiceState, spec: Speculation | None = None) -> dict:
+    """Complaint Agent: 处理投诉（情感分析 + 升级判断）"""
+    user_message = state["user_message"]
+
+    # LLM 回复在后台流式生成：短路升级（或推测执行落选）时设置 cancel，生成线程在下一段输出到达时
+    # 关闭流式请求，不再为剩下的 token 付费（首个 token 之前已发出的请求无法撤回）
+    cancel = spec.cancel if spec is not None else threading.Event()
+    reply = _complaint_pool.submit(
+        _complaint_reply,
+        [SystemMessage(content=COMPLAINT_PROMPT), HumanMessage(content=user_message)],
+        cancel,
+        spec,
+    )
+
+    local = escalation.score(user_message, use_classifier=ESCALATION_CLASSIFIER)
+    side_effect(spec, metrics.observe, "escalation.score", local.score)
+    if ESCALATION_SHORT_CIRCUIT is not None and local.score >= ESCALATION_SHORT_CIRCUIT:
+        cancel.set()
+        side_effect(spec, metrics.incr, "escalation.short_circuits")
+        reason = f"本地评分 {local.score:.2f}（{'、'.join(local.reasons)}）"
+        return {
+            "response": ESCALATION_REPLY + ESCALATION_NOTICE,
+            "escalated": True,
+            "debug_info": [f"🚨 Complaint Agent 快速升级人工（{reason}，未等待 LLM）"]
+        }
 
     try:
-        content = response.content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        result = json.loads(content)
-        response_text = result.get("response", "非常抱歉给您带来不便，我们将尽快为您处理。")
-        escalate = result.get("escalate", False)
+        result = reply.result()
+    except Exception:
+        result = None
+
+    if result is not None:
+        response_text = result.get("response") or "非常抱歉给您带来不便，我们将尽快为您处理。"
+        escalate = bool(result.get("escalate", False))
         reason = result.get("reason", "")
-    except (json.JSONDecodeError, KeyError):
+    else:
+        # LLM 回复不可用时按本地评分决定是否升级
         response_text = "非常抱歉给您带来不便，我们将尽快为您处理。"
-        escalate = False
-        reason = ""
+        escalate = local.score >= ESCALATION_FALLBACK
+        reason = f"本地评分 {local.score:.2f}（{'、'.join(local.reasons)}）" if escalate else ""
 
-    debug_msg = f"🚨 Complaint Agent 已处理投诉"
+    debug_msg = f"🚨 Complaint Agent 已处理投诉（本地评分 {local.score:.2f}）"
     if escalate:
         debug_msg += f" → 升级人工（原因：{reason}）"
-        response_text += "\n\n由于您的情况较为特殊，我已为您转接人工客服，稍后将有专人为您处理。"
+        response_text += ESCALATION_NOTICE
 
     return {
         "response": response_text,
@@ -305,18 +715,19 @@ escalate 规则：
     }
 
 
-def chitchat_agent_node(state: CustomerServiceState) -> dict:
+def chitchat_agent_node(state: CustomerServiceState, spec: Speculation | None = None) -> dict:
     """Chitchat Agent: 闲聊兜底"""
     user_message = state["user_message"]
 
-    response = llm.invoke([
+    response_text = llm_reply([
         SystemMessage(content="""你是友好的客服助手。请用轻松愉快的语气回应用户的闲聊或问候。
 如果用户问题不明确，请引导用户描述具体需求（订单查询、技术支持、FAQ 等）。"""),
+        *context_messages(state),
         HumanMessage(content=user_message)
-    ])
+    ], spec)
 
     return {
-        "response": response.content,
+        "response": response_text,
         "debug_info": [f"😊 Chitchat Agent 已回复"]
     }
 
@@ -349,6 +760,51 @@ def qa_inspector_node(state: CustomerServiceState) -> dict:
     }
 
 
+def remember_node(state: CustomerServiceState) -> dict:
+    """Memory: 更新跨轮的上一轮意图、订单号和对话摘要"""
+    # 只记订单查询轮次里、且订单库确认存在的订单号：其他消息里的长数字可能是热线（12315）、金额或电话
+    order_ids = state.get("order_ids", [])
+    if state["intent"] == "order":
+        mentioned = extract_order_ids(state["user_message"])
+        found = order_store.get_many(mentioned) if mentioned else {}
+        order_ids = order_ids + [order_id for order_id in mentioned if order_id in found]
+    order_ids = list(dict.fromkeys(reversed(order_ids)))[:MAX_REMEMBERED_ORDERS][::-1]
+
+    turn = (f"用户：{state['user_message'][:SUMMARY_CHARS]}（{state['intent']}）"
+            f" / 客服：{state['response'][:SUMMARY_CHARS]}")
+    turns = (state.get("summary") or "").splitlines() + [turn.replace("\n", " ")]
+
+    return {
+        "last_intent": state["intent"],
+        "order_ids": order_ids,
+        "summary": "\n".join(turns[-SUMMARY_TURNS:]),
+    }
+
+
+# Router 推测执行时按意图查找专业 Agent
+SPECIALISTS = {
+    "faq": faq_agent_node,
+    "order": order_agent_node,
+    "tech_support": tech_support_agent_node,
+    "complaint": complaint_agent_node,
+    "chitchat": chitchat_agent_node,
+}
+
+
+def speculation_summary() -> str:
+    """推测路由的命中率和省下的延迟（按意图）"""
+    lines = []
+    for intent in SPECIALISTS:
+        hits = metrics.get("speculation.hits", intent=intent)
+        total = hits + metrics.get("speculation.misses", intent=intent) + metrics.get("speculation.errors", intent=intent)
+        if total:
+            saved = metrics.samples("speculation.saved", intent=intent)
+            avg = sum(saved) / len(saved) if saved else 0.0
+            lines.append(f"{intent}：命中 {int(hits)}/{int(total)}（{hits / total:.0%}），"
+                         f"平均省下 {avg:.2f}s，累计 {sum(saved):.1f}s")
+    return "推测路由：" + ("；".join(lines) if lines else "暂无推测")
+
+
 # ======================== 条件路由 ========================
 
 def route_by_intent(state: CustomerServiceState) -> Literal["faq", "order", "tech_support", "complaint", "chitchat"]:
@@ -370,12 +826,10 @@ def build_customer_service_graph():
 
     # 添加节点
     graph.add_node("router", router_node)
-    graph.add_node("faq", faq_agent_node)
-    graph.add_node("order", order_agent_node)
-    graph.add_node("tech_support", tech_support_agent_node)
-    graph.add_node("complaint", complaint_agent_node)
-    graph.add_node("chitchat", chitchat_agent_node)
+    for intent, node in SPECIALISTS.items():
+        graph.add_node(intent, with_speculation(node))
     graph.add_node("qa_inspector", qa_inspector_node)
+    graph.add_node("remember", remember_node)
 
     # 起始边
     graph.add_edge(START, "router")
@@ -398,13 +852,15 @@ def build_customer_service_graph():
     # Complaint 特殊处理：可能升级人工
     graph.add_conditional_edges("complaint", check_escalation, {
         "qa_inspector": "qa_inspector",
-        "escalate": END,  # 升级人工时直接结束
+        "escalate": "remember",  # 升级人工时跳过质检
     })
 
-    # QA Inspector 后结束
-    graph.add_edge("qa_inspector", END)
+    # QA Inspector 后记录本轮上下文，然后结束
+    graph.add_edge("qa_inspector", "remember")
+    graph.add_edge("remember", END)
 
-    return graph.compile()
+    # 按用户会话的 thread_id 保存对话状态，只需保留最新的 checkpoint
+    return graph.compile(checkpointer=PruningSaver(keep_last=1))
 
 
 # ======================== Gradio 前端 ========================
@@ -412,15 +868,19 @@ def build_customer_service_graph():
 customer_service_app = build_customer_service_graph()
 
 
-def handle_customer_message(message: str, history: list):
+def session_thread_id(request: gr.Request) -> str:
+    """每个浏览器会话一个 thread_id"""
+    return f"cs:{request.session_hash}"
+
+
+def handle_customer_message(message: str, history: list, request: gr.Request):
     """处理用户消息"""
     if not message.strip():
-        return history, ""
+        return history, "", speculation_summary()
 
-    # 调用 Graph
-    result = customer_service_app.invoke({
-        "user_message": message,
-    })
+    # 调用 Graph：每个浏览器会话一个 thread_id，跨轮保留意图、订单号和摘要
+    config = {"configurable": {"thread_id": session_thread_id(request)}}
+    result = customer_service_app.invoke(new_turn(message), config)
 
     # 提取回复和调试信息
     bot_response = result.get("response", "抱歉，系统出现问题，请稍后再试。")
@@ -438,7 +898,26 @@ def handle_customer_message(message: str, history: list):
     history.append({"role": "user", "content": message})
     history.append({"role": "assistant", "content": bot_response})
 
-    return history, ""
+    return history, "", speculation_summary()
+
+
+def end_session(request: gr.Request) -> None:
+    """浏览器会话结束（关闭或刷新页面）时删除该会话的对话状态，内存中的 checkpointer 不随会话数增长"""
+    customer_service_app.checkpointer.delete_thread(session_thread_id(request))
+
+
+def invalidate_faq_answer(question: str) -> str:
+    """手动失效缓存答案；问题为空时清空全部"""
+    removed = faq_answers.invalidate(question.strip() or None)
+    return f"已删除 {removed} 条缓存答案，剩余 {len(faq_answers)} 条"
+
+
+def promote_faq_answers() -> str:
+    """把命中次数达到 FAQ_PROMOTE_HITS 的缓存答案提升进 FAQ 知识库"""
+    promoted = faq_answers.promote(FAQ_KNOWLEDGE_BASE, FAQ_PROMOTE_HITS)
+    if not promoted:
+        return f"没有命中 {FAQ_PROMOTE_HITS} 次以上的缓存答案"
+    return "已提升进知识库：" + "、".join(promoted)
 
 
 with gr.Blocks(theme=gr.themes.Soft(), title="智能客服系统") as chat_ui:
@@ -457,6 +936,8 @@ with gr.Blocks(theme=gr.themes.Soft(), title="智能客服系统") as chat_ui:
         )
         send_btn = gr.Button("发送", variant="primary", scale=1)
 
+    speculation_stats = gr.Markdown(speculation_summary())
+
     # 快捷示例
     gr.Examples(
         examples=[
@@ -469,17 +950,28 @@ with gr.Blocks(theme=gr.themes.Soft(), title="智能客服系统") as chat_ui:
         inputs=user_input,
     )
 
+    with gr.Accordion("🗂️ FAQ 答案缓存", open=False):
+        with gr.Row():
+            faq_question = gr.Textbox(label="问题", placeholder="留空则清空全部缓存", scale=4)
+            invalidate_btn = gr.Button("失效", scale=1)
+            promote_btn = gr.Button("提升热门答案进知识库", scale=1)
+        faq_status = gr.Markdown()
+
+    invalidate_btn.click(fn=invalidate_faq_answer, inputs=faq_question, outputs=faq_status)
+    promote_btn.click(fn=promote_faq_answers, outputs=faq_status)
+
     # 绑定事件
     send_btn.click(
         fn=handle_customer_message,
         inputs=[user_input, chatbot],
-        outputs=[chatbot, user_input],
+        outputs=[chatbot, user_input, speculation_stats],
     )
     user_input.submit(
         fn=handle_customer_message,
         inputs=[user_input, chatbot],
-        outputs=[chatbot, user_input],
+        outputs=[chatbot, user_input, speculation_stats],
     )
+    chat_ui.unload(end_session)
 
 
 if __name__ == "__main__":
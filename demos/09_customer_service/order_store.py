@@ -0,0 +1,255 @@
+"""Demo 09 的订单 / 物流存储
+
+订单和物流轨迹存进本地 SQLite（默认 .cache/orders.sqlite3，可用环境变量 ORDER_DB_PATH 覆盖），
+首次打开空库时写入演示用的两笔订单。接入真实业务系统时，实现同样的 get / get_many /
+find_by_tracking / find_by_user / logistics 方法并替换 main.py 中的 order_store 即可。
+
+- 索引：订单号为主键，物流单号、用户 ID 各建索引；物流轨迹按 (单号, 序号) 聚簇存放
+- 连接池：每个线程一个连接（WAL 模式下读不互斥），语句用固定 SQL + 参数，由 sqlite3 的语句缓存复用预编译结果
+- 批量查询：一条消息里的多个订单号用一次 IN 查询取回
+- 读穿缓存：按订单号缓存查询结果（TTL + LRU），订单状态会变，TTL 较短；查不到的订单不缓存
+- 命中 / 未命中次数记录在 shared.metrics 中
+
+生成大规模模拟数据并压测查询延迟见 bench_order_store.py。
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from datetime import date, timedelta
+from pathlib import Path
+
+from shared.metrics import metrics
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / ".cache" / "orders.sqlite3"
+# 读穿缓存的新鲜期（秒）和容量（条）
+CACHE_TTL = 30
+CACHE_SIZE = 10_000
+# 每个连接缓存的预编译语句数
+CACHED_STATEMENTS = 64
+# 单次 IN 查询的参数上限（SQLite 默认 999）
+MAX_BATCH = 500
+
+CARRIERS = {"SF": "顺丰速运", "YT": "圆通速递", "ZT": "中通快递", "JD": "京东物流"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id           TEXT PRIMARY KEY,
+    user_id            TEXT NOT NULL,
+    status             TEXT NOT NULL,
+    tracking           TEXT NOT NULL,
+    carrier            TEXT NOT NULL,
+    items              TEXT NOT NULL,
+    total              REAL NOT NULL,
+    estimated_delivery TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_tracking ON orders (tracking);
+CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id);
+CREATE TABLE IF NOT EXISTS logistics_events (
+    tracking TEXT NOT NULL,
+    seq      INTEGER NOT NULL,
+    time     TEXT NOT NULL,
+    location TEXT NOT NULL,
+    event    TEXT NOT NULL,
+    PRIMARY KEY (tracking, seq)
+) WITHOUT ROWID;
+"""
+
+_ORDER_COLUMNS = "order_id, user_id, status, tracking, carrier, items, total, estimated_delivery"
+
+# 演示数据：空库时写入
+SEED_ORDERS = [
+    ("12345", "u001", "已发货", "SF1234567890", "顺丰速运", ["无线耳机 x1", "手机壳 x2"], 299.0, "2026-02-18"),
+    ("67890", "u002", "配送中", "YT9876543210", "圆通速递", ["运动手表 x1"], 799.0, "2026-02-16"),
+]
+SEED_EVENTS = [
+    ("SF1234567890", 1, "2026-02-15 10:30", "深圳转运中心", "快件已到达"),
+    ("SF1234567890", 2, "2026-02-15 14:20", "深圳", "派送中，预计今日送达"),
+    ("SF1234567890", 3, "2026-02-15 16:45", "深圳", "快件已签收"),
+    ("YT9876543210", 1, "2026-02-14 18:00", "上海仓库", "已发货"),
+    ("YT9876543210", 2, "2026-02-15 09:15", "杭州转运中心", "运输中"),
+    ("YT9876543210", 3, "2026-02-16", "", "预计送达"),
+]
+
+
+def _row_to_order(row: tuple) -> dict:
+    order_id, user_id, status, tracking, carrier, items, total, estimated_delivery = row
+    return {
+        "order_id": order_id,
+        "user_id": user_id,
+        "status": status,
+        "tracking": tracking,
+        "carrier": carrier,
+        "items": json.loads(items),
+        "total": total,
+        "estimated_delivery": estimated_delivery,
+    }
+
+
+def _order_row(order: tuple) -> tuple:
+    *head, items, total, estimated_delivery = order
+    return (*head, json.dumps(items, ensure_ascii=False), total, estimated_delivery)
+
+
+class OrderStore:
+    """基于 SQLite 的订单存储，线程安全"""
+
+    def __init__(self, path: str | Path | None = None, cache_ttl: float = CACHE_TTL, cache_size: int = CACHE_SIZE):
+        self.path = Path(path or os.getenv("ORDER_DB_PATH") or DEFAULT_PATH)
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._cache_lock = threading.Lock()
+        self._cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    # ---------- 连接 ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每个线程一个连接；首次使用时才建库，导入模块不产生文件
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._initialize()
+            conn = sqlite3.connect(self.path, cached_statements=CACHED_STATEMENTS)
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+        return conn
+
+    def _initialize(self) -> None:
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with closing(sqlite3.connect(self.path)) as conn, conn:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(_SCHEMA)
+                if conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0:
+                    self._insert(conn, SEED_ORDERS, SEED_EVENTS)
+            self._initialized = True
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, orders: list[tuple], events: list[tuple]) -> None:
+        conn.executemany(f"INSERT OR REPLACE INTO orders ({_ORDER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         [_order_row(order) for order in orders])
+        conn.executemany("INSERT OR REPLACE INTO logistics_events VALUES (?, ?, ?, ?, ?)", events)
+
+    def load(self, orders: list[tuple], events: list[tuple]) -> None:
+        """批量写入订单和物流轨迹（格式同 SEED_ORDERS / SEED_EVENTS）"""
+        self._initialize()
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            self._insert(conn, orders, events)
+        self.clear_cache()
+
+    # ---------- 读穿缓存 ----------
+
+    def _cached(self, order_id: str) -> dict | None:
+        with self._cache_lock:
+            entry = self._cache.get(order_id)
+            if entry and entry[0] > time.monotonic():
+                self._cache.move_to_end(order_id)
+                return entry[1]
+            if entry:
+                del self._cache[order_id]
+        return None
+
+    def _remember(self, orders: list[dict]) -> None:
+        expires = time.monotonic() + self.cache_ttl
+        with self._cache_lock:
+            for order in orders:
+                self._cache[order["order_id"]] = (expires, order)
+                self._cache.move_to_end(order["order_id"])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    # ---------- 查询 ----------
+
+    def get(self, order_id: str) -> dict | None:
+        return self.get_many([order_id]).get(order_id)
+
+    def get_many(self, order_ids: list[str]) -> dict[str, dict]:
+        """批量按订单号查询，返回 {订单号: 订单}，查不到的订单号不在结果中"""
+        found, missing = {}, []
+        for order_id in dict.fromkeys(order_ids):
+            order = self._cached(order_id)
+            if order is None:
+                missing.append(order_id)
+            else:
+                found[order_id] = order
+        metrics.incr("order_store.cache_hits", len(found))
+        metrics.incr("order_store.cache_misses", len(missing))
+
+        fetched = []
+        conn = self._connect()
+        for start in range(0, len(missing), MAX_BATCH):
+            chunk = missing[start:start + MAX_BATCH]
+            placeholders = ", ".join("?" * len(chunk))
+            fetched += [_row_to_order(row) for row in conn.execute(
+                f"SELECT {_ORDER_COLUMNS} FROM orders WHERE order_id IN ({placeholders})", chunk
+            )]
+        self._remember(fetched)
+        found.update((order["order_id"], order) for order in fetched)
+        return found
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def find_by_tracking(self, tracking: str) -> dict | None:
+        row = self._connect().execute(
+            f"SELECT {_ORDER_COLUMNS} FROM orders WHERE tracking = ?", (tracking,)
+        ).fetchone()
+        return _row_to_order(row) if row else None
+
+    def find_by_user(self, user_id: str, limit: int = 20) -> list[dict]:
+        return [_row_to_order(row) for row in self._connect().execute(
+            f"SELECT {_ORDER_COLUMNS} FROM orders WHERE user_id = ? ORDER BY order_id DESC LIMIT ?",
+            (user_id, limit),
+        )]
+
+    def logistics(self, tracking: str) -> tuple[str, list[tuple]] | None:
+        """查询物流轨迹，返回 (承运商, [(时间, 地点, 事件), ...])；单号不存在时返回 None"""
+        conn = self._connect()
+        events = conn.execute(
+            "SELECT time, location, event FROM logistics_events WHERE tracking = ? ORDER BY seq", (tracking,)
+        ).fetchall()
+        if not events:
+            return None
+        row = conn.execute("SELECT carrier FROM orders WHERE tracking = ?", (tracking,)).fetchone()
+        carrier = row[0] if row else CARRIERS.get(tracking[:2].upper(), "未知承运商")
+        return carrier, events
+
+
+# ======================== 模拟数据 ========================
+
+ITEMS = ["无线耳机", "手机壳", "运动手表", "充电宝", "数据线", "蓝牙音箱", "机械键盘", "显示器支架"]
+STATUSES = ["待发货", "已发货", "配送中", "已签收"]
+CITIES = ["深圳", "上海", "杭州", "北京", "广州", "成都", "武汉"]
+
+
+def generate(store: OrderStore, rows: int, users: int = 100_000, seed: int = 0, chunk: int = 50_000) -> None:
+    """生成 rows 笔模拟订单（每笔带 2 条物流轨迹）写入 store，分块提交控制内存"""
+    rng = random.Random(seed)
+    start_day = date(2026, 1, 1)
+    for offset in range(0, rows, chunk):
+        orders, events = [], []
+        for i in range(offset, min(rows, offset + chunk)):
+            prefix = rng.choice(list(CARRIERS))
+            tracking = f"{prefix}{rng.randrange(10**10):010d}"
+            day = start_day + timedelta(days=rng.randrange(60))
+            items = [f"{rng.choice(ITEMS)} x{rng.randint(1, 3)}" for _ in range(rng.randint(1, 3))]
+            orders.append((f"{1_000_000 + i}", f"u{rng.randrange(users):06d}", rng.choice(STATUSES), tracking,
+                           CARRIERS[prefix], items, round(rng.uniform(20, 2000), 1),
+                           (day + timedelta(days=3)).isoformat()))
+            src, dst = rng.sample(CITIES, 2)
+            events.append((tracking, 1, f"{day.isoformat()} 18:00", f"{src}仓库", "已发货"))
+            events.append((tracking, 2, f"{(day + timedelta(days=1)).isoformat()} 09:15", f"{dst}转运中心", "运输中"))
+        store.load(orders, events)
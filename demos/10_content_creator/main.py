@@ -8,7 +8,7 @@ Demo 10: AI 自媒体运营助手 (Content Creator Assistant)
 - Fact Checker: 事实核查（并行）
 - SEO Optimizer: SEO 优化（并行）
 - Editor: 主编审核（Reflection）
-- Platform Adapter: 多平台格式适配（结构化输出）
+- Platform Adapter: 多平台格式适配（每个平台一个并行分支，结构化输出）
 
 图结构：
   START → planner → trend_researcher → content_creator
@@ -19,12 +19,18 @@ Demo 10: AI 自媒体运营助手 (Content Creator Assistant)
                             editor (review)
                                 ↓
                    ┌─ revise → content_creator (带反馈)
-                   └─ approve → platform_adapter → END
+                   └─ approve ─┬─ adapt_wechat ──────┐
+                               ├─ adapt_weibo ───────┼─→ publish → END
+                               └─ adapt_xiaohongshu ─┘
 """
 
 import os
 import json
+import logging
+import time
 import operator
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
 from typing import TypedDict, Annotated, Literal
 from shared import setup
 
@@ -33,20 +39,52 @@ from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import tool
 from langgraph.graph import StateGraph, START, END
+from shared.sections import (
+    Section, split_sections, join_sections, number_sections, outline,
+    split_paragraphs, content_hash,
+)
+from shared.artifacts import artifacts, format_age
+from shared.cancel import CancelToken, Cancelled, record_run, summary as cancel_summary
+from shared.checkpoint import PruningSaver
+from shared.metrics import metrics
+from shared.structured import invoke_json, stream_json, summary as structured_summary
+from shared.singleflight import SingleFlight
+from shared.text import normalize_text
+from shared.tokens import estimate_tokens
+from shared.ui import FrameThrottle, LiveDraft, ProgressLog, merge_frames
 
 setup()
 
+logger = logging.getLogger(__name__)
+
 # ======================== 全局模型 ========================
 
 llm = init_chat_model("openai:gpt-5.2", temperature=0)
 creative_llm = init_chat_model("openai:gpt-5.2", temperature=0.8)
 
+# 主编审核不通过时只重写被点名的章节（False 则整篇重写）
+SECTION_REVISION = True
+# 批量 LLM 调用（章节重写）的最大并发数
+MAX_CONCURRENCY = 4
+
+# 投机执行：主编审核的同时提前做平台适配（在 UI 中勾选开启）
+speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-adapter")
+
+# 同一主题 + 风格的内容在该时长（秒）内直接返回缓存结果
+CONTENT_CACHE_TTL = 24 * 3600
+
 
 # ======================== State 定义 ========================
 
+def merge_dicts(left: dict, right: dict) -> dict:
+    """字典合并 reducer：并行分支各自写入不同的 key"""
+    return {**(left or {}), **(right or {})}
+
+
 class ContentCreationState(TypedDict):
     topic: str                          # 用户输入的主题
     style: str                          # 内容风格（专业/轻松/幽默）
+    speculative: bool                   # 是否开启投机平台适配
     plan: list[str]                     # Planner 拆解的任务步骤
     trend_research: str                 # 热点调研结果
     draft: str                          # 内容初稿
@@ -54,8 +92,14 @@ class ContentCreationState(TypedDict):
     seo_suggestions: str                # SEO 优化建议
     editor_review: str                  # 主编审核意见
     editor_score: int                   # 主编评分 (1-10)
+    flagged_sections: list[dict]        # 主编点名需修改的章节 [{"index": 章节编号, "feedback": 意见}]
+    revised_sections: list[int]         # 本轮重写的章节编号（空表示整篇重写）
+    fact_check_cache: dict              # 段落哈希 → 该段的核查问题列表（跨修改轮复用）
+    seo_cache: dict                     # {"paragraphs": 上轮各段哈希, "suggestions": 上轮 SEO 建议}
     revision_count: int                 # 修改次数
-    final_content: dict                 # 最终内容（多平台格式）
+    final_content: Annotated[dict, merge_dicts]  # 最终内容（多平台格式，各平台分支分别写入）
+    speculative_content: dict           # 投机适配结果 {"draft_hash": 草稿哈希, "content": 多平台内容}
+    speculation_stats: Annotated[list[dict], operator.add]  # 每轮投机的收益 {"kept", "saved_seconds", "wasted_tokens", "errors"}
     progress: Annotated[list[str], operator.add]  # 进度日志
 
 
@@ -144,6 +188,57 @@ def trend_researcher_node(state: ContentCreationState) -> dict:
     }
 
 
+STYLE_GUIDE = {
+    "专业": "使用专业术语，数据驱动，逻辑严密，适合行业从业者阅读",
+    "轻松": "语言活泼，通俗易懂，多用比喻和案例，适合大众读者",
+    "幽默": "轻松诙谐，适当调侃，段子和梗适度，适合年轻用户"
+}
+
+
+def revise_sections(state: ContentCreationState) -> dict | None:
+    """Content Creator 的增量修改模式：只重写主编点名的章节，其余章节原样复用"""
+    sections = split_sections(state["draft"])
+    targets = [f for f in state.get("flagged_sections", []) if 1 <= f["index"] <= len(sections)]
+    if not targets:
+        return None
+
+    style_guide = STYLE_GUIDE.get(state["style"], "专业严谨")
+    responses = creative_llm.batch([
+        [
+            SystemMessage(content=f"""你是一位优秀的自媒体内容创作者，正在根据主编意见修改文章中的一个章节。
+
+**风格要求：** {style_guide}
+
+全文目录：
+{outline(sections)}
+
+要求：
+- 只输出修改后的第 {f["index"]} 节，保留原有的 Markdown 标题行
+- 与上下文章节保持衔接，不要重复其他章节的内容
+- 观点要有数据或案例支撑"""),
+            HumanMessage(content=f"主题：{state['topic']}\n\n主编意见：{f['feedback']}\n\n"
+                                 f"原章节：\n{sections[f['index'] - 1].text}")
+        ]
+        for f in targets
+    ], config={"max_concurrency": MAX_CONCURRENCY})
+
+    for f, response in zip(targets, responses):
+        old = sections[f["index"] - 1]
+        sections[f["index"] - 1] = Section(title=old.title, text=response.content.strip() + "\n\n")
+
+    revision_count = state.get("revision_count", 0)
+    revised = [f["index"] for f in targets]
+
+    return {
+        "draft": join_sections(sections),
+        "revision_count": revision_count + 1,
+        "revised_sections": revised,
+        "progress": [f"✍️ **Content Creator** 完成修改稿（第 {revision_count + 1} 版）"
+                     f"— 仅重写第 {', '.join(map(str, revised))} 节，其余 "
+                     f"{len(sections) - len(revised)} 节原样复用"]
+    }
+
+
 def content_creator_node(state: ContentCreationState) -> dict:
     """Content Creator Agent: 内容创作"""
     topic = state["topic"]
@@ -151,20 +246,19 @@ def content_creator_node(state: ContentCreationState) -> dict:
     research = state["trend_research"]
     editor_review = state.get("editor_review", "")
 
+    if SECTION_REVISION and editor_review and state.get("flagged_sections"):
+        result = revise_sections(state)
+        if result is not None:
+            return result
+
     revision_hint = ""
     if editor_review:
         revision_hint = f"\n\n⚠️ 主编审核意见（请根据反馈修改）：\n{editor_review}"
 
-    style_guide = {
-        "专业": "使用专业术语，数据驱动，逻辑严密，适合行业从业者阅读",
-        "轻松": "语言活泼，通俗易懂，多用比喻和案例，适合大众读者",
-        "幽默": "轻松诙谐，适当调侃，段子和梗适度，适合年轻用户"
-    }
-
     response = creative_llm.invoke([
         SystemMessage(content=f"""你是一位优秀的自媒体内容创作者。请根据调研结果撰写一篇高质量文章。
 
-**风格要求：** {style_guide.get(style, "专业严谨")}
+**风格要求：** {STYLE_GUIDE.get(style, "专业严谨")}
 
 **文章结构：**
 1. **吸睛标题**（包含数字、疑问或对比）
@@ -190,16 +284,49 @@ def content_creator_node(state: ContentCreationState) -> dict:
     return {
         "draft": response.content,
         "revision_count": revision_count + 1,
+        "revised_sections": [],
         "progress": [f"✍️ **Content Creator** 完成{label}（第 {revision_count + 1} 版）"]
     }
 
 
+FACT_CHECK_SCHEMA = {
+    "title": "fact_check",
+    "type": "object",
+    "properties": {
+        "issues": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "paragraph": {"type": "integer"},
+                    "problem": {"type": "string"},
+                    "severity": {"type": "string", "enum": ["高", "中", "低"]},
+                },
+                "required": ["paragraph", "problem", "severity"],
+            },
+        },
+    },
+    "required": ["issues"],
+}
+
+
 def fact_checker_node(state: ContentCreationState) -> dict:
-    """Fact Checker Agent: 事实核查（并行执行）"""
+    """Fact Checker Agent: 事实核查（并行执行）
+
+    按段落内容哈希缓存核查结果：修改轮只核查新增或改动过的段落，未变段落直接复用上轮结论。
+    """
     draft = state["draft"]
+    paragraphs = split_paragraphs(draft)
+    hashes = [content_hash(p) for p in paragraphs]
+    cache = state.get("fact_check_cache", {})
 
-    response = llm.invoke([
-        SystemMessage(content="""你是专业的事实核查员。请检查文章中的数据、观点是否准确可信。
+    # 只保留当前草稿仍在使用的段落，缓存不会随修改轮数增长
+    new_cache = {h: cache[h] for h in hashes if h in cache}
+    pending = [i for i, h in enumerate(hashes) if h not in cache]
+
+    if pending:
+        result = invoke_json(llm, [
+            SystemMessage(content="""你是专业的事实核查员。请检查以下段落中的数据、观点是否准确可信。
 
 检查维度：
 1. 数据来源是否可靠
@@ -207,48 +334,47 @@ def fact_checker_node(state: ContentCreationState) -> dict:
 3. 因果关系是否成立
 4. 是否有常识性错误
 
-请输出 JSON 格式：
+请输出 JSON 格式（paragraph 为【段落 N】中的 N，没有问题的段落不要列出）：
 {
   "issues": [
-    {"location": "第X段", "problem": "问题描述", "severity": "高/中/低"}
-  ],
-  "overall": "整体评价",
-  "passed": true/false
+    {"paragraph": 3, "problem": "问题描述", "severity": "高/中/低"}
+  ]
 }
 
 只返回 JSON，不要其他内容。"""),
-        HumanMessage(content=draft)
-    ])
-
-    try:
-        content = response.content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        result = json.loads(content)
-        issues = result.get("issues", [])
-        passed = result.get("passed", True)
-
-        if passed:
-            fact_check_text = "✅ 事实核查通过，未发现明显问题"
-        else:
-            issues_text = "\n".join([f"- {issue['location']}: {issue['problem']}" for issue in issues[:3]])
-            fact_check_text = f"⚠️ 发现 {len(issues)} 处问题：\n{issues_text}"
-    except (json.JSONDecodeError, KeyError):
-        fact_check_text = "✅ 事实核查通过"
+            HumanMessage(content="\n\n".join(f"【段落 {i + 1}】\n{paragraphs[i]}" for i in pending))
+        ], FACT_CHECK_SCHEMA, name="fact_checker")
+
+        # 解析失败（result 为 None）的段落不写入缓存，下一轮重新核查
+        if result is not None:
+            checked = {hashes[i]: [] for i in pending}
+            for issue in result.get("issues", []):
+                paragraph = issue.get("paragraph") if isinstance(issue, dict) else None
+                if isinstance(paragraph, int) and paragraph - 1 in pending and issue.get("problem"):
+                    checked[hashes[paragraph - 1]].append(
+                        {"problem": issue["problem"], "severity": issue.get("severity", "中")}
+                    )
+            new_cache.update(checked)
+
+    issues = [
+        {"location": f"第{i + 1}段", **issue}
+        for i, h in enumerate(hashes) for issue in new_cache.get(h, [])
+    ]
+    if not issues:
+        fact_check_text = "✅ 事实核查通过，未发现明显问题"
+    else:
+        issues_text = "\n".join([f"- {issue['location']}: {issue['problem']}" for issue in issues[:3]])
+        fact_check_text = f"⚠️ 发现 {len(issues)} 处问题：\n{issues_text}"
 
+    reused = len(paragraphs) - len(pending)
     return {
         "fact_check_result": fact_check_text,
-        "progress": ["🔍 **Fact Checker** 完成事实核查"]
+        "fact_check_cache": new_cache,
+        "progress": [f"🔍 **Fact Checker** 完成事实核查（新核查 {len(pending)} 段，复用缓存 {reused} 段）"]
     }
 
 
-def seo_optimizer_node(state: ContentCreationState) -> dict:
-    """SEO Optimizer Agent: SEO 优化建议（并行执行）"""
-    draft = state["draft"]
-    topic = state["topic"]
-
-    response = llm.invoke([
-        SystemMessage(content="""你是 SEO 优化专家。请分析文章的 SEO 表现并提供优化建议。
+SEO_PROMPT = """你是 SEO 优化专家。请分析文章的 SEO 表现并提供优化建议。
 
 分析维度：
 1. 标题是否包含关键词
@@ -257,24 +383,110 @@ def seo_optimizer_node(state: ContentCreationState) -> dict:
 4. 是否有内外链机会
 5. meta 描述建议
 
-请给出具体的优化建议（3-5 条）。"""),
-        HumanMessage(content=f"主题关键词：{topic}\n\n文章内容：\n{draft}")
-    ])
+请给出具体的优化建议（3-5 条）。"""
+
+
+def seo_optimizer_node(state: ContentCreationState) -> dict:
+    """SEO Optimizer Agent: SEO 优化建议（并行执行）
+
+    草稿段落未变时直接复用上轮建议；只有部分段落改动时，基于上轮建议 + 改动段落增量更新。
+    """
+    draft = state["draft"]
+    topic = state["topic"]
+    paragraphs = split_paragraphs(draft)
+    hashes = [content_hash(p) for p in paragraphs]
+    cache = state.get("seo_cache", {})
+
+    if cache and cache["paragraphs"] == hashes:
+        return {
+            "seo_suggestions": cache["suggestions"],
+            "progress": ["🎯 **SEO Optimizer** 草稿未变，复用上轮 SEO 分析"]
+        }
+
+    if cache:
+        previous = set(cache["paragraphs"])
+        changed = [p for p, h in zip(paragraphs, hashes) if h not in previous]
+        response = llm.invoke([
+            SystemMessage(content=SEO_PROMPT + "\n\n文章已在上一轮做过 SEO 分析，本轮只改动了部分段落。"
+                                               "请结合文章目录和改动段落，在上一轮建议的基础上更新建议。"),
+            HumanMessage(content=f"主题关键词：{topic}\n\n文章标题：{paragraphs[0] if paragraphs else ''}\n\n"
+                                 f"文章目录：\n{outline(split_sections(draft))}\n\n"
+                                 f"上一轮建议：\n{cache['suggestions']}\n\n"
+                                 f"改动的段落（共 {len(changed)}/{len(paragraphs)} 段）：\n" + "\n\n".join(changed))
+        ])
+        label = f"增量更新 SEO 分析（改动 {len(changed)}/{len(paragraphs)} 段）"
+    else:
+        response = llm.invoke([
+            SystemMessage(content=SEO_PROMPT),
+            HumanMessage(content=f"主题关键词：{topic}\n\n文章内容：\n{draft}")
+        ])
+        label = "完成 SEO 分析"
 
     return {
         "seo_suggestions": response.content,
-        "progress": ["🎯 **SEO Optimizer** 完成 SEO 分析"]
+        "seo_cache": {"paragraphs": hashes, "suggestions": response.content},
+        "progress": [f"🎯 **SEO Optimizer** {label}"]
     }
 
 
+EDITOR_SCHEMA = {
+    "title": "editor_review",
+    "type": "object",
+    "properties": {
+        "scores": {"type": "object", "additionalProperties": {"type": "integer"}},
+        "overall_score": {"type": "integer", "minimum": 1, "maximum": 10},
+        "passed": {"type": "boolean"},
+        "feedback": {"type": "string"},
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"index": {"type": "integer"}, "feedback": {"type": "string"}},
+                "required": ["index", "feedback"],
+            },
+        },
+    },
+    "required": ["overall_score", "passed", "feedback"],
+}
+
+
 def editor_node(state: ContentCreationState) -> dict:
-    """Editor Agent: 主编审核（Reflection）"""
+    """Editor Agent: 主编审核（Reflection）
+
+    Content Creator 只重写了部分章节时，只复审这些章节，其余章节视为上一轮已认可。
+    """
     draft = state["draft"]
     fact_check = state["fact_check_result"]
     seo = state["seo_suggestions"]
+    revised = state.get("revised_sections", [])
+    sections = split_sections(draft)
+
+    # 投机执行：大多数草稿一次就能过审，与主编审核并行提前做平台适配
+    speculation = None
+    if state.get("speculative"):
+        cancel = threading.Event()
+        started = time.perf_counter()
+        futures = {
+            platform: speculation_pool.submit(adapt_platform, platform, draft, cancel)
+            for platform in PLATFORM_SPECS
+        }
+        speculation = (futures, cancel, started)
+
+    if SECTION_REVISION and revised:
+        scope = "本轮只修改了部分章节，其余章节已在上一轮审核中认可。请重点判断修改后的章节是否解决了上一轮的问题，并给出全文的综合评分。"
+        article = (
+            f"全文目录：\n{outline(sections)}\n\n上一轮审核意见：{state.get('editor_review', '')}\n\n"
+            "修改后的章节：\n"
+            + "\n\n".join(f"【第 {i} 节】\n{sections[i - 1].text.strip()}"
+                           for i in revised if i <= len(sections))
+        )
+    else:
+        scope = "请审核整篇文章。"
+        article = number_sections(sections)
 
-    response = llm.invoke([
-        SystemMessage(content="""你是资深内容主编。请综合评估文章质量并给出审核意见。
+    try:
+        result = invoke_json(llm, [
+            SystemMessage(content=f"""你是资深内容主编。{scope}请综合评估文章质量并给出审核意见。
 
 评估维度：
 1. **吸引力** (1-10)：标题和开头是否吸睛
@@ -284,103 +496,235 @@ def editor_node(state: ContentCreationState) -> dict:
 5. **SEO 友好度** (1-10)：基于 SEO 分析结果
 
 请输出 JSON 格式：
-{
-  "scores": {"吸引力": 8, "内容质量": 7, ...},
+{{
+  "scores": {{"吸引力": 8, "内容质量": 7, ...}},
   "overall_score": 8,
   "passed": true,
-  "feedback": "具体的审核意见和修改建议..."
-}
+  "feedback": "具体的审核意见和修改建议...",
+  "sections": [{{"index": 2, "feedback": "该节的具体修改意见"}}]
+}}
 
 overall_score >= 8 且无硬伤时 passed 为 true，否则为 false。
+passed 为 false 时，在 sections 中列出需要修改的章节编号（即【第 N 节】中的 N）及修改意见；
+如果问题涉及全文结构或标题，需要整体重写，sections 留空。
 只返回 JSON，不要其他内容。"""),
-        HumanMessage(content=f"文章：\n{draft}\n\n事实核查：{fact_check}\n\nSEO 分析：{seo}")
-    ])
-
-    try:
-        content = response.content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        result = json.loads(content)
+            HumanMessage(content=f"文章：\n{article}\n\n事实核查：{fact_check}\n\nSEO 分析：{seo}")
+        ], EDITOR_SCHEMA, name="editor")
+    except BaseException:
+        # 运行被取消（或审核出错）时，投机任务随之中止
+        if speculation:
+            speculation[1].set()
+        raise
+
+    if result is not None:
         score = result.get("overall_score", 8)
         feedback = result.get("feedback", "")
         passed = result.get("passed", score >= 8)
         scores_detail = result.get("scores", {})
-    except (json.JSONDecodeError, KeyError):
+        flagged = [
+            {"index": item["index"], "feedback": item.get("feedback", feedback)}
+            for item in result.get("sections", [])
+            if isinstance(item, dict) and isinstance(item.get("index"), int)
+        ]
+    else:
         score = 8
-        feedback = "审核通过，内容质量合格。"
+        feedback = "审核结果解析失败，按合格处理。"
         passed = True
         scores_detail = {}
+        flagged = []
 
     scores_str = " | ".join(f"{k}:{v}" for k, v in scores_detail.items()) if scores_detail else ""
     status = "✅ 通过" if passed else "🔄 需修改"
+    flagged_str = f"\n   待修改章节：{', '.join(str(f['index']) for f in flagged)}" if flagged and not passed else ""
 
-    return {
+    result = {
         "editor_review": feedback,
         "editor_score": score,
+        "flagged_sections": [] if passed else flagged,
         "progress": [
             f"👔 **Editor** 审核完成 — {status}（综合评分：{score}/10）\n"
             f"   {scores_str}\n"
-            f"   意见：{feedback[:80]}..."
+            f"   意见：{feedback[:80]}...{flagged_str}"
         ]
     }
+    if speculation is not None:
+        settled = settle_speculation(
+            speculation, draft, keep=not needs_revision(score, state.get("revision_count", 0))
+        )
+        result["progress"] += settled.pop("progress", [])
+        result.update(settled)
+    return result
+
+
+def settle_speculation(speculation, draft: str, keep: bool) -> dict:
+    """主编审核结束后结算投机结果：通过则保留，需修改则取消并丢弃"""
+    futures, cancel, started = speculation
+    editor_done = time.perf_counter()
+
+    if keep:
+        try:
+            results = {platform: future.result() for platform, future in futures.items()}
+        except Exception as e:
+            # 投机适配本身失败时，交给各平台分支正常重做
+            return {
+                "speculative_content": {},
+                "speculation_stats": [{"kept": False, "saved_seconds": 0.0, "wasted_tokens": 0, "errors": 1}],
+                "progress": [f"⚡ **Speculation** 投机适配失败（{type(e).__name__}），由各平台分支重做"],
+            }
+        # 串行耗时 = 审核 + 最慢的平台分支；并行耗时 = 等到两者都完成
+        slowest = max(elapsed for _, _, elapsed in results.values())
+        saved = (editor_done - started) + slowest - (time.perf_counter() - started)
+        return {
+            "speculative_content": {
+                "draft_hash": content_hash(draft),
+                "content": {platform: content for platform, (content, _, _) in results.items()},
+            },
+            "speculation_stats": [{"kept": True, "saved_seconds": saved, "wasted_tokens": 0, "errors": 0}],
+            "progress": [f"⚡ **Speculation** 投机适配命中，节省约 {saved:.1f}s"],
+        }
 
+    cancel.set()
+    tokens = errors = 0
+    for future in futures.values():
+        future.cancel()
+        try:
+            tokens += future.result()[1]
+        except CancelledError:
+            pass  # 尚未开始执行就被取消，没有浪费
+        except Exception:
+            # 投机结果本来就要丢弃，适配失败不能影响主流程；已消耗的 token 无从统计，按 0 计
+            errors += 1
+    return {
+        "speculative_content": {},
+        "speculation_stats": [{"kept": False, "saved_seconds": 0.0, "wasted_tokens": tokens, "errors": errors}],
+        "progress": [f"⚡ **Speculation** 草稿需修改，已取消投机适配（浪费约 {tokens} tokens"
+                     + (f"，{errors} 个平台适配失败" if errors else "") + "）"],
+    }
 
-def platform_adapter_node(state: ContentCreationState) -> dict:
-    """Platform Adapter Agent: 多平台格式适配"""
-    draft = state["draft"]
-
-    response = llm.invoke([
-        SystemMessage(content="""你是多平台内容适配专家。请将文章改编为不同平台格式。
 
-请输出 JSON 格式（包含 3 个平台版本）：
-{
-  "wechat": {
-    "title": "适合公众号的标题",
-    "summary": "摘要（100字内）",
-    "content": "完整内容（保留原文核心，优化排版）"
-  },
-  "weibo": {
-    "title": "微博标题（50字内）",
-    "content": "微博正文（280字内，提炼核心观点 + 话题标签）"
-  },
-  "xiaohongshu": {
-    "title": "小红书标题（吸睛、口语化）",
-    "content": "小红书正文（800字内，多用 emoji、分段明确）"
-  }
+# 各平台的改编要求：每个平台独立一次模型调用，有各自的长度预算和输出字段
+PLATFORM_SPECS = {
+    "wechat": {
+        "name": "公众号",
+        "fields": {
+            "title": "适合公众号的标题",
+            "summary": "摘要（100字内）",
+            "content": "完整内容（保留原文核心，优化排版）",
+        },
+        "max_chars": 5000,
+    },
+    "weibo": {
+        "name": "微博",
+        "fields": {
+            "title": "微博标题（50字内）",
+            "content": "微博正文（280字内，提炼核心观点 + 话题标签）",
+        },
+        "max_chars": 280,
+    },
+    "xiaohongshu": {
+        "name": "小红书",
+        "fields": {
+            "title": "小红书标题（吸睛、口语化）",
+            "content": "小红书正文（800字内，多用 emoji、分段明确）",
+        },
+        "max_chars": 800,
+    },
 }
 
-只返回 JSON，不要其他内容。"""),
+
+def adapt_platform(platform: str, draft: str,
+                   cancel: threading.Event | None = None) -> tuple[dict | None, int, float]:
+    """把草稿改编为单个平台的版本，返回 (平台内容, 消耗 token 数, 耗时秒数)
+
+    以流式方式调用模型，cancel 被置位时立即中断（关闭 HTTP 流），返回的内容为 None。
+    """
+    spec = PLATFORM_SPECS[platform]
+    schema = {
+        "title": f"{platform}_post",
+        "type": "object",
+        "properties": {field: {"type": "string", "description": desc} for field, desc in spec["fields"].items()},
+        "required": list(spec["fields"]),
+    }
+    prompt = f"""你是多平台内容适配专家。请将文章改编为{spec["name"]}平台的格式。
+
+请输出 JSON 格式：
+{json.dumps(spec["fields"], ensure_ascii=False, indent=2)}
+
+只返回 JSON，不要其他内容。"""
+
+    started = time.perf_counter()
+    tokens = estimate_tokens(prompt) + estimate_tokens(draft)
+    fallback = {"title": "内容标题", "content": draft}   # 只影响当前平台，其他平台不受牵连
+    result, text = fallback, ""
+    for partial in stream_json(llm, [
+        SystemMessage(content=prompt),
         HumanMessage(content=draft)
-    ])
+    ], schema, name=f"adapt_{platform}", default=fallback):
+        if cancel is not None and cancel.is_set():
+            return None, tokens + estimate_tokens(partial.text), time.perf_counter() - started
+        result, text = partial.value, partial.text
 
-    try:
-        content = response.content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        final_content = json.loads(content)
-    except (json.JSONDecodeError, KeyError):
-        final_content = {
-            "wechat": {"title": "内容标题", "content": draft},
-            "weibo": {"title": "内容标题", "content": draft[:280]},
-            "xiaohongshu": {"title": "内容标题", "content": draft[:800]},
+    result = {**result, "content": str(result.get("content", ""))[:spec["max_chars"]]}
+    return result, tokens + estimate_tokens(text), time.perf_counter() - started
+
+
+def make_platform_adapter(platform: str):
+    """为单个平台生成 Platform Adapter 分支节点（命中投机结果时直接复用）"""
+    name = PLATFORM_SPECS[platform]["name"]
+
+    def platform_adapter_node(state: ContentCreationState) -> dict:
+        draft = state["draft"]
+        speculative = state.get("speculative_content") or {}
+
+        if speculative.get("draft_hash") == content_hash(draft):
+            content = speculative["content"][platform]
+            log = f"📱 **Platform Adapter** 复用投机结果：{name}版"
+        else:
+            content, _, elapsed = adapt_platform(platform, draft)
+            log = f"📱 **Platform Adapter** 完成{name}版适配（{elapsed:.1f}s）"
+
+        return {
+            "final_content": {platform: content},
+            "progress": [log]
         }
 
-    return {
-        "final_content": final_content,
-        "progress": ["📱 **Platform Adapter** 完成多平台格式适配"]
-    }
+    platform_adapter_node.__name__ = f"adapt_{platform}_node"
+    return platform_adapter_node
+
+
+def publish_node(state: ContentCreationState) -> dict:
+    """汇总：所有平台分支完成后输出总结"""
+    progress = [f"📱 **Platform Adapter** 完成 {len(state['final_content'])} 个平台的格式适配"]
+    stats = state.get("speculation_stats", [])
+    if stats:
+        saved = sum(s["saved_seconds"] for s in stats)
+        wasted = sum(s["wasted_tokens"] for s in stats)
+        hits = sum(1 for s in stats if s["kept"])
+        errors = sum(s.get("errors", 0) for s in stats)
+        progress.append(f"⚡ **Speculation** 汇总：命中 {hits}/{len(stats)} 轮，"
+                        f"节省约 {saved:.1f}s，浪费约 {wasted} tokens"
+                        + (f"，适配失败 {errors} 次" if errors else ""))
+    return {"progress": progress}
 
 
 # ======================== 条件路由 ========================
 
-def should_revise(state: ContentCreationState) -> Literal["content_creator", "platform_adapter"]:
-    """判断是否需要修改"""
+PLATFORM_NODES = [f"adapt_{platform}" for platform in PLATFORM_SPECS]
+
+
+def needs_revision(score: int, revision_count: int) -> bool:
+    """主编评分不足且仍有修改次数时退回修改"""
+    return score < 8 and revision_count < 2
+
+
+def should_revise(state: ContentCreationState) -> Literal["content_creator"] | list[str]:
+    """判断是否需要修改；通过时同时分发到所有平台分支"""
     score = state.get("editor_score", 10)
     revision_count = state.get("revision_count", 0)
 
-    if score < 8 and revision_count < 2:
+    if needs_revision(score, revision_count):
         return "content_creator"
-    return "platform_adapter"
+    return PLATFORM_NODES
 
 
 # ======================== 构建 Graph ========================
@@ -395,7 +739,9 @@ def build_content_creation_graph():
     graph.add_node("fact_checker", fact_checker_node)
     graph.add_node("seo_optimizer", seo_optimizer_node)
     graph.add_node("editor", editor_node)
-    graph.add_node("platform_adapter", platform_adapter_node)
+    for platform in PLATFORM_SPECS:
+        graph.add_node(f"adapt_{platform}", make_platform_adapter(platform))
+    graph.add_node("publish", publish_node)
 
     # 添加边
     graph.add_edge(START, "planner")
@@ -410,65 +756,183 @@ def build_content_creation_graph():
     graph.add_edge("fact_checker", "editor")
     graph.add_edge("seo_optimizer", "editor")
 
-    # 主编审核后，条件路由
-    graph.add_conditional_edges("editor", should_revise, {
-        "content_creator": "content_creator",
-        "platform_adapter": "platform_adapter",
-    })
+    # 主编审核后，条件路由：退回修改，或并行分发到各平台分支
+    graph.add_conditional_edges("editor", should_revise, ["content_creator", *PLATFORM_NODES])
+
+    # 所有平台分支完成后汇总
+    graph.add_edge(PLATFORM_NODES, "publish")
+    graph.add_edge("publish", END)
+
+    # 按请求的 thread_id 保存检查点：运行被取消后，已完成的步骤下次可直接复用
+    return graph.compile(checkpointer=PruningSaver(keep_last=2))
+
+
+content_creation_app = build_content_creation_graph()
+
 
-    graph.add_edge("platform_adapter", END)
+# ======================== 内容缓存 ========================
 
-    return graph.compile()
+# 后台刷新使用的线程池，以及正在刷新的 (主题, 风格)（不重复提交）
+refresh_pool = ThreadPoolExecutor(max_workers=2)
+_refreshing: set[tuple[str, str]] = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh(topic: str, style: str) -> None:
+    config = {"configurable": {"thread_id": f"refresh:{normalize_text(topic)}:{style}"}}
+    try:
+        result = content_creation_app.invoke(
+            {"topic": topic, "style": style, "speculative": False, "revision_count": 0}, config)
+        if result.get("final_content"):
+            artifacts.put("content", topic, {"draft": result["draft"], "final_content": result["final_content"]},
+                          style=style)
+    finally:
+        content_creation_app.checkpointer.delete_thread(config["configurable"]["thread_id"])
+        with _refreshing_lock:
+            _refreshing.discard((normalize_text(topic), style))
+
+
+def _log_refresh_failure(future: Future, topic: str, style: str) -> None:
+    # 后台刷新没有人等待结果，异常只能在这里记下来，否则会随 future 一起被丢弃
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("后台刷新「%s」（%s）失败", topic, style, exc_info=future.exception())
+
+
+def refresh_content(topic: str, style: str) -> str:
+    """在后台重新创作并覆盖缓存，立即返回提示"""
+    if not topic.strip():
+        return "⚠️ 请输入内容主题"
+    key = (normalize_text(topic), style)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return f"⏳ 「{topic}」（{style}）正在后台刷新中，完成后重新创作即可获取新版本"
+        _refreshing.add(key)
+    future = refresh_pool.submit(_refresh, topic, style)
+    future.add_done_callback(lambda f: _log_refresh_failure(f, topic, style))
+    return f"🔄 已在后台刷新「{topic}」（{style}），完成后重新创作即可获取新版本"
 
 
 # ======================== Gradio 前端 ========================
 
-content_creation_app = build_content_creation_graph()
 
+def render_platforms(final: dict) -> tuple[str, str]:
+    """渲染公众号版和其他平台版，尚未完成的平台显示占位提示"""
+    pending = "*⏳ 生成中...*"
+
+    wechat = final.get("wechat")
+    wechat_text = f"# {wechat.get('title', '')}\n\n{wechat.get('content', '')}" if wechat else pending
+
+    parts = []
+    for platform in ("weibo", "xiaohongshu"):
+        version = final.get(platform)
+        body = f"**标题：** {version.get('title', '')}\n\n{version.get('content', '')}" if version else pending
+        parts.append(f"## 📱 {PLATFORM_SPECS[platform]['name']}版本\n\n{body}")
+    return wechat_text, "\n\n---\n\n".join(parts)
+
+
+# 同一主题 + 风格的在途创作只跑一次，重复请求挂到已有执行上
+content_flights = SingleFlight("content", merge=merge_frames)
+
+
+def create_content(topic: str, style: str, speculative: bool = False):
+    """流式运行内容创作系统；相同请求已有在途执行时直接订阅它的进度"""
+    key = (normalize_text(topic), style, speculative)
+    yield from content_flights.stream(key, lambda cancel: _create_content(topic, style, speculative, cancel))
+
+
+def _create_content(topic: str, style: str, speculative: bool, cancel: threading.Event):
+    """执行内容创作流水线，按固定帧率返回各面板（未变化的面板不重发）
 
-def create_content(topic: str, style: str):
-    """流式运行内容创作系统"""
+    cancel 被设置（所有订阅者都已离开）后，图内下一次节点 / 模型调用开始或下一个 token 到达时停止；
+    已完成的步骤留在检查点里，相同请求再次到来时从中断处继续。
+    """
     if not topic.strip():
         yield "⚠️ 请输入内容主题", "", "", ""
         return
 
-    progress_text = f"## 🚀 开始创作：{topic}（风格：{style}）\n\n"
+    cached = artifacts.get("content", topic, style=style, max_age=CONTENT_CACHE_TTL)
+    if cached:
+        yield (f"## 📦 命中缓存：{topic}（风格：{style}）\n\n该内容已于 {format_age(cached.age)}生成，直接返回缓存结果。\n\n"
+               "如需最新内容，可点击「🔄 后台刷新」。"), cached.value["draft"], *render_platforms(cached.value["final_content"])
+        return
+
+    progress = ProgressLog(f"## 🚀 开始创作：{topic}（风格：{style}）")
     draft_text = ""
     wechat_text = ""
     other_platforms_text = ""
+    final = {}
+    live = LiveDraft({"content_creator": "✍️ Creator"})
+    frames = FrameThrottle()
+    first_token_logged = False
+
+    token = CancelToken(cancel)
+    thread_id = f"content:{normalize_text(topic)}:{style}:{int(speculative)}"
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [token]}
+    inputs = {"topic": topic, "style": style, "speculative": speculative, "revision_count": 0}
+    snapshot = content_creation_app.get_state(config)
+    if snapshot.next:
+        inputs = None
+        progress.add(f"♻️ 从上次中断处继续，已完成的步骤不再重跑（下一步：{', '.join(snapshot.next)}）")
+
+    yield frames.frame(progress.render("⏳ 正在启动内容创作流程..."), draft_text,
+                       wechat_text, other_platforms_text, force=True)
+
+    # 流式执行：updates 提供节点级进度，messages 提供 Creator 的逐 token 输出
+    try:
+        for mode, data in content_creation_app.stream(
+            inputs,
+            config,
+            stream_mode=["updates", "messages"],
+        ):
+            if mode == "messages":
+                if not live.feed(*data):
+                    continue
+                if not first_token_logged:
+                    first_token_logged = True
+                    metrics.observe("ui.time_to_first_content", live.first_token_at, demo="10")
+                    progress.add(f"⏱️ 初稿首字可见：{live.first_token_at:.2f}s")
+                # token 是高频事件，交给 FrameThrottle 合并
+                frame = frames.frame(progress.render(), live.render(), wechat_text, other_platforms_text)
+                if frame:
+                    yield frame
+                continue
+
+            for node_name, node_output in data.items():
+                # 更新进度
+                for log in node_output.get("progress", []):
+                    progress.add(log)
+
+                # 更新草稿
+                if "draft" in node_output:
+                    live.reset()
+                    draft_text = node_output["draft"]
+
+                # 更新最终内容：各平台分支完成一个就渲染一个，不必等最慢的平台
+                if "final_content" in node_output:
+                    final.update(node_output["final_content"])
+                    wechat_text, other_platforms_text = render_platforms(final)
+
+            # 节点级事件频率低且之后可能长时间无事件，立即出帧
+            frame = frames.frame(progress.render(), live.render() or draft_text,
+                                 wechat_text, other_platforms_text, force=True)
+            if frame:
+                yield frame
+    except Cancelled:
+        # 没有订阅者了，这一帧不会被看到，只记录指标
+        saved = record_run("10", token, cancelled=True)
+        yield frames.frame(progress.render(f"\n---\n⏹️ **已取消**（估算节省 {saved} tokens）"), draft_text,
+                           wechat_text, other_platforms_text, force=True)
+        return
 
-    yield progress_text + "⏳ 正在启动内容创作流程...", draft_text, wechat_text, other_platforms_text
-
-    # 流式执行
-    for event in content_creation_app.stream(
-        {"topic": topic, "style": style, "revision_count": 0},
-        stream_mode="updates",
-    ):
-        for node_name, node_output in event.items():
-            # 更新进度
-            if "progress" in node_output:
-                for log in node_output["progress"]:
-                    progress_text += f"\n{log}\n"
-
-            # 更新草稿
-            if "draft" in node_output:
-                draft_text = node_output["draft"]
-
-            # 更新最终内容
-            if "final_content" in node_output:
-                final = node_output["final_content"]
-                wechat = final.get("wechat", {})
-                weibo = final.get("weibo", {})
-                xiaohongshu = final.get("xiaohongshu", {})
-
-                wechat_text = f"# {wechat.get('title', '')}\n\n{wechat.get('content', '')}"
-
-                other_platforms_text = f"## 📱 微博版本\n\n**标题：** {weibo.get('title', '')}\n\n{weibo.get('content', '')}\n\n"
-                other_platforms_text += f"---\n\n## 📱 小红书版本\n\n**标题：** {xiaohongshu.get('title', '')}\n\n{xiaohongshu.get('content', '')}"
+    record_run("10", token, cancelled=False)
+    content_creation_app.checkpointer.delete_thread(thread_id)
 
-            yield progress_text, draft_text, wechat_text, other_platforms_text
+    if all(platform in final for platform in PLATFORM_SPECS):
+        artifacts.put("content", topic, {"draft": draft_text, "final_content": final}, style=style)
 
-    yield progress_text + "\n---\n🎉 **内容创作完成！**", draft_text, wechat_text, other_platforms_text
+    footer = f"\n---\n🎉 **内容创作完成！**\n\n<small>📈 {structured_summary()}；{cancel_summary('10')}</small>"
+    yield frames.frame(progress.render(footer, full=True), draft_text,
+                       wechat_text, other_platforms_text, force=True)
 
 
 with gr.Blocks(theme=gr.themes.Soft(), title="AI 自媒体运营助手") as chat_ui:
@@ -486,7 +950,15 @@ with gr.Blocks(theme=gr.themes.Soft(), title="AI 自媒体运营助手") as chat
             value="轻松",
             scale=1
         )
+        speculative_input = gr.Checkbox(
+            label="⚡ 投机适配",
+            info="主编审核的同时提前做平台适配",
+            value=False,
+            scale=1
+        )
         create_btn = gr.Button("🚀 开始创作", variant="primary", scale=1)
+        stop_btn = gr.Button("⏹️ 停止", variant="stop", scale=1)
+        refresh_btn = gr.Button("🔄 后台刷新", scale=1)
 
     with gr.Row():
         with gr.Column(scale=1):
@@ -501,12 +973,21 @@ with gr.Blocks(theme=gr.themes.Soft(), title="AI 自媒体运营助手") as chat
                 with gr.Tab("📱 其他平台"):
                     other_output = gr.Markdown(value="*微博和小红书版本将在这里显示...*")
 
-    create_btn.click(
+    create_event = create_btn.click(
         fn=create_content,
-        inputs=[topic_input, style_input],
+        inputs=[topic_input, style_input, speculative_input],
         outputs=[progress_output, draft_output, wechat_output, other_output],
     )
 
+    # 停止 / 关闭页面都会关闭 create_content 生成器，进而取消图的运行
+    stop_btn.click(fn=None, cancels=[create_event])
+
+    refresh_btn.click(
+        fn=refresh_content,
+        inputs=[topic_input, style_input],
+        outputs=[progress_output],
+    )
+
     gr.Examples(
         examples=[
             ["人工智能在教育行业的应用", "轻松"],
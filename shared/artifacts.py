@@ -0,0 +1,162 @@
+"""shared.artifacts - 流水线产物的持久化缓存
+
+研报（08）、多平台内容（10）这类完整流水线的产物按「类型 + 规范化主题 + 风格」存进
+本地 SQLite，同一主题在新鲜期内再次请求时直接返回，不必重跑整条流水线。
+
+- 主题先用 shared.text.normalize_text 规范化（全半角统一、去空白和标点、小写），「人工智能在医疗行业的应用前景」
+  与「 人工智能在医疗行业的应用前景？」命中同一条
+- 每条记录带生成时间，读取时按新鲜期过滤；写入时淘汰过期记录，并在总大小超限时按
+  最近访问时间淘汰
+- 命中、未命中、淘汰次数记录在 shared.metrics 中（按类型打标签）
+
+用法：
+    from shared.artifacts import artifacts
+    hit = artifacts.get("report", topic, max_age=REPORT_CACHE_TTL)
+    if hit:
+        show(hit.value, hit.age)
+    ...
+    artifacts.put("report", topic, final_report)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from shared.metrics import metrics
+from shared.text import normalize_text
+
+# 默认存储位置：项目根目录下的 .cache/，可用环境变量 ARTIFACT_CACHE_PATH 覆盖
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / ".cache" / "artifacts.sqlite3"
+# 记录保留时长（秒），超过即淘汰；读取时的新鲜期可以更短
+MAX_AGE = 7 * 24 * 3600
+# 所有记录的总大小上限（字节）
+MAX_BYTES = 50 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    kind        TEXT NOT NULL,
+    topic_key   TEXT NOT NULL,
+    style       TEXT NOT NULL,
+    topic       TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (kind, topic_key, style)
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts (created_at);
+CREATE INDEX IF NOT EXISTS idx_artifacts_accessed ON artifacts (accessed_at);
+"""
+
+
+class Artifact(NamedTuple):
+    value: Any          # 缓存的产物（put 时传入的 JSON 可序列化对象）
+    topic: str          # 生成时的原始主题
+    created_at: float   # 生成时间（时间戳）
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+
+def format_age(seconds: float) -> str:
+    """把缓存年龄格式化成「N 分钟前」之类的文字"""
+    if seconds < 60:
+        return "刚刚"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} 分钟前"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} 小时前"
+    return f"{int(seconds // 86400)} 天前"
+
+
+class ArtifactStore:
+    """基于 SQLite 的产物缓存，线程安全"""
+
+    def __init__(self, path: str | Path | None = None, max_age: float = MAX_AGE, max_bytes: int = MAX_BYTES):
+        self.path = Path(path or os.getenv("ARTIFACT_CACHE_PATH") or DEFAULT_PATH)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # 首次使用时才建库，导入模块不产生文件
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def get(self, kind: str, topic: str, style: str = "", max_age: float | None = None) -> Artifact | None:
+        """读取新鲜期（默认 max_age）内的产物，没有则返回 None"""
+        max_age = self.max_age if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, topic, created_at FROM artifacts"
+                " WHERE kind = ? AND topic_key = ? AND style = ? AND created_at >= ?",
+                (kind, normalize_text(topic), style, now - max_age),
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE artifacts SET accessed_at = ? WHERE kind = ? AND topic_key = ? AND style = ?",
+                    (now, kind, normalize_text(topic), style),
+                )
+                conn.commit()
+
+        metrics.incr("artifacts.hits" if row else "artifacts.misses", kind=kind)
+        if not row:
+            return None
+        return Artifact(json.loads(row[0]), row[1], row[2])
+
+    def put(self, kind: str, topic: str, value: Any, style: str = "") -> None:
+        """写入（覆盖）产物，并按年龄和总大小淘汰"""
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, normalize_text(topic), style, topic, data, len(data.encode()), now, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def invalidate(self, kind: str, topic: str, style: str = "") -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM artifacts WHERE kind = ? AND topic_key = ? AND style = ?",
+                (kind, normalize_text(topic), style),
+            )
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        expired = conn.execute("DELETE FROM artifacts WHERE created_at < ?", (now - self.max_age,)).rowcount
+        evicted = 0
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        if total > self.max_bytes:
+            # 按最近访问时间从旧到新淘汰，直到总大小回到上限以内
+            for kind, topic_key, style, size in conn.execute(
+                "SELECT kind, topic_key, style, size FROM artifacts ORDER BY accessed_at"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute(
+                    "DELETE FROM artifacts WHERE kind = ? AND topic_key = ? AND style = ?",
+                    (kind, topic_key, style),
+                )
+                total -= size
+                evicted += 1
+        if expired or evicted:
+            metrics.incr("artifacts.evictions", expired + evicted)
+
+
+# 进程级默认实例
+artifacts = ArtifactStore()
@@ -0,0 +1,99 @@
+"""shared.cancel - 图运行的协作式取消
+
+用户关掉页面、点击停止或换了主题后，流水线不应继续把剩下的 LLM 调用跑完。
+CancelToken 是一个 LangChain 回调：把它放进运行 config 的 callbacks，会随 config
+传递到图内每个节点、嵌套的 ReAct Agent 和每次模型调用。取消后：
+
+- 下一个节点 / 模型调用 / 工具调用开始时直接抛出 Cancelled
+- 正在流式生成的模型调用在下一个 token 到达时抛出 Cancelled，中断底层 HTTP 响应
+  （stream_mode 含 "messages" 时图内所有聊天模型调用都走流式）
+- 配合 checkpointer，已完成的步骤保留在检查点里，同一 thread_id 下次可从中断处继续
+
+CancelToken 同时统计本次运行消耗的 token，用于估算取消节省的 token。
+
+用法：
+    token = CancelToken(cancel_event)
+    try:
+        for event in app.stream(inputs, {"callbacks": [token], ...}):
+            ...
+    except Cancelled:
+        ...
+"""
+
+import threading
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from shared.metrics import metrics
+from shared.tokens import estimate_tokens
+
+
+class Cancelled(Exception):
+    """运行已被取消"""
+
+
+class CancelToken(BaseCallbackHandler):
+    """可取消的运行令牌，同时统计 token 消耗"""
+
+    # 回调里抛出的异常要传播给调用方，而不是被回调管理器吞掉记日志
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, event: threading.Event | None = None):
+        self.event = event or threading.Event()
+        self.tokens = 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def cancel(self) -> None:
+        self.event.set()
+
+    def check(self) -> None:
+        if self.event.is_set():
+            raise Cancelled()
+
+    def on_chain_start(self, serialized: Any, inputs: Any, **kwargs: Any) -> None:
+        self.check()
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, **kwargs: Any) -> None:
+        self.check()
+
+    def on_llm_start(self, serialized: Any, prompts: Any, **kwargs: Any) -> None:
+        self.check()
+
+    def on_tool_start(self, serialized: Any, input_str: str, **kwargs: Any) -> None:
+        self.check()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.check()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                self.tokens += usage["total_tokens"] if usage else estimate_tokens(generation.text)
+
+
+def record_run(demo: str, token: CancelToken, cancelled: bool) -> int:
+    """记录一次运行的结果；取消时返回估算节省的 token 数（按已完成运行的平均消耗减去已用量）"""
+    if not cancelled:
+        metrics.observe("pipeline.tokens", token.tokens, demo=demo)
+        return 0
+
+    completed = metrics.samples("pipeline.tokens", demo=demo)
+    saved = max(0, round(sum(completed) / len(completed) - token.tokens)) if completed else 0
+    metrics.incr("pipeline.cancellations", demo=demo)
+    metrics.incr("pipeline.tokens_saved", saved, demo=demo)
+    return saved
+
+
+def summary(demo: str) -> str:
+    """取消相关指标摘要，用于在 UI 上展示"""
+    return (
+        f"已取消 {int(metrics.get('pipeline.cancellations', demo=demo))} 次运行，"
+        f"估算节省 {int(metrics.get('pipeline.tokens_saved', demo=demo))} tokens"
+    )
@@ -0,0 +1,162 @@
+"""shared.checkpoint - 紧凑的 Checkpoint 存储
+
+LangGraph 默认的 JsonPlusSerializer 已经用 msgpack 编码，但不做压缩；
+InMemorySaver 也会把每个线程的每一个 checkpoint 永久保留。
+
+这里提供两件东西：
+- CompressedSerializer：在 msgpack 之上再套一层 zstd（可选预训练字典）
+- PruningSaver：按线程只保留最近 N 个 checkpoint 的 InMemorySaver
+
+zstandard 只在使用 CompressedSerializer 时才导入，只用 PruningSaver 的 demo 不需要安装它。
+
+用法：
+    from shared.checkpoint import CompressedSerializer, PruningSaver
+    checkpointer = PruningSaver(keep_last=5, serde=CompressedSerializer())
+"""
+
+from typing import TYPE_CHECKING, Any, Iterable
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+if TYPE_CHECKING:
+    import zstandard as zstd
+
+# 小于该字节数的负载直接存原文：zstd 帧头本身就有十几个字节，压不动
+MIN_COMPRESS_SIZE = 64
+
+
+class CompressedSerializer(SerializerProtocol):
+    """msgpack + zstd 序列化器（仿照 EncryptedSerializer 的包装方式）。
+
+    压缩后的类型标记是在内层类型后追加 "+zstd" / "+zstd-dict"（如 "msgpack+zstd"、
+    "msgpack+aes+zstd"）；不带压缩后缀的数据（旧数据、太小未压缩的负载）原样交给内层序列化器。
+    """
+
+    def __init__(
+        self,
+        serde: SerializerProtocol | None = None,
+        level: int = 3,
+        dict_data: "zstd.ZstdCompressionDict | None" = None,
+    ) -> None:
+        import zstandard as zstd
+
+        self.serde = serde or JsonPlusSerializer()
+        self.level = level
+        self.dict_data = dict_data
+        self._compressor = zstd.ZstdCompressor(level=level)
+        self._decompressor = zstd.ZstdDecompressor()
+        self._dict_compressor = None
+        self._dict_decompressor = None
+        if dict_data is not None:
+            self._dict_compressor = zstd.ZstdCompressor(level=level, dict_data=dict_data)
+            self._dict_decompressor = zstd.ZstdDecompressor(dict_data=dict_data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        typ, data = self.serde.dumps_typed(obj)
+        if len(data) < MIN_COMPRESS_SIZE:
+            return typ, data
+        if self._dict_compressor is not None:
+            return f"{typ}+zstd-dict", self._dict_compressor.compress(data)
+        return f"{typ}+zstd", self._compressor.compress(data)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        typ, payload = data
+        # 压缩后缀总在最后；内层序列化器自己的类型标记也可能带 "+"（如 EncryptedSerializer 的 "msgpack+aes"）
+        inner, _, codec = typ.rpartition("+")
+        if codec == "zstd-dict":
+            if self._dict_decompressor is None:
+                raise ValueError("该 checkpoint 使用字典压缩，但序列化器未加载字典")
+            return self.serde.loads_typed((inner, self._dict_decompressor.decompress(payload)))
+        if codec == "zstd":
+            return self.serde.loads_typed((inner, self._decompressor.decompress(payload)))
+        # 不是已知的压缩后缀：未压缩的数据，原样交给内层序列化器
+        return self.serde.loads_typed(data)
+
+    @classmethod
+    def train(
+        cls,
+        samples: Iterable[Any],
+        dict_size: int = 16 * 1024,
+        level: int = 3,
+        serde: SerializerProtocol | None = None,
+    ) -> "CompressedSerializer":
+        """用一批典型 State 训练 zstd 字典，返回带字典的序列化器。
+
+        样本太少时 zstd 会拒绝训练，建议至少准备几十个典型 State。
+        """
+        import zstandard as zstd
+
+        serde = serde or JsonPlusSerializer()
+        encoded = [serde.dumps_typed(s)[1] for s in samples]
+        dict_data = zstd.train_dictionary(dict_size, encoded, level=level)
+        return cls(serde=serde, level=level, dict_data=dict_data)
+
+
+class PruningSaver(InMemorySaver):
+    """只保留每个线程（及命名空间）最近 keep_last 个 checkpoint 的 InMemorySaver。
+
+    被淘汰的 checkpoint 连同它的 pending writes 以及不再被任何保留 checkpoint
+    引用的 channel blob 一起删除。历史回溯（get_state_history）只能看到保留窗口内的记录。
+    """
+
+    def __init__(self, *, keep_last: int = 5, serde: SerializerProtocol | None = None) -> None:
+        if keep_last < 1:
+            raise ValueError("keep_last 至少为 1")
+        super().__init__(serde=serde)
+        self.keep_last = keep_last
+        # (thread_id, checkpoint_ns, checkpoint_id) -> channel_versions，用于判断 blob 是否还被引用
+        self._versions: dict[tuple[str, str, str], dict[str, Any]] = {}
+        # (thread_id, checkpoint_ns) -> 已写入的 (channel, version)，避免每次剪枝都扫全部 blob
+        self._blob_index: dict[tuple[str, str], set[tuple[str, Any]]] = {}
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = next_config["configurable"]["thread_id"]
+        checkpoint_ns = next_config["configurable"]["checkpoint_ns"]
+        self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(
+            checkpoint["channel_versions"]
+        )
+        self._blob_index.setdefault((thread_id, checkpoint_ns), set()).update(new_versions.items())
+        self._prune(thread_id, checkpoint_ns)
+        return next_config
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        ns_storage = self.storage[thread_id][checkpoint_ns]
+        if len(ns_storage) <= self.keep_last:
+            return
+
+        # checkpoint id 是 uuid6，按字典序即按时间序
+        ordered = sorted(ns_storage)
+        for checkpoint_id in ordered[: -self.keep_last]:
+            del ns_storage[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        live = {
+            (channel, version)
+            for checkpoint_id in ordered[-self.keep_last:]
+            for channel, version in self._versions.get(
+                (thread_id, checkpoint_ns, checkpoint_id), {}
+            ).items()
+        }
+        index = self._blob_index[(thread_id, checkpoint_ns)]
+        for channel, version in index - live:
+            self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+        index &= live
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        for key in [k for k in self._versions if k[0] == thread_id]:
+            del self._versions[key]
+        for key in [k for k in self._blob_index if k[0] == thread_id]:
+            del self._blob_index[key]
@@ -0,0 +1,65 @@
+"""shared.dedup - 基于 MinHash 的近似去重
+
+不依赖向量模型：把文本规范化后切成字符 n-gram（对中文同样有效），用 MinHash 签名
+估计两段文本的 Jaccard 相似度，超过阈值即视为重复。
+
+- signature(text) 计算签名，相同文本的签名总是相同（哈希参数用固定种子生成）
+- similarity(a, b) 比较两个签名
+- cluster(texts, threshold) 贪心聚类：每段文本归到第一个与之相似的代表上，返回各自的代表下标
+- ignore 参数给出所有文本共有的背景（如研究主题），它的 n-gram 不参与比较，
+  否则共同的长前缀会让本不相同的文本显得相似
+
+子问题、资料条目都只有几十条，两两比较即可，不需要 LSH 分桶。
+
+用法：
+    reps = cluster(sub_questions, threshold=0.6, k=2)
+    kept = [q for i, q in enumerate(sub_questions) if reps[i] == i]
+"""
+
+import random
+import zlib
+
+from shared.text import normalize_text
+
+# 签名长度：越长估计越准，64 时误差约 ±0.12
+NUM_PERM = 64
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20250101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(text: str, k: int = 3) -> set[str]:
+    """规范化（去空白标点、小写、全半角统一）后的字符 k-gram 集合"""
+    text = normalize_text(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def signature(text: str, k: int = 3, ignore: str = "") -> tuple[int, ...]:
+    """文本的 MinHash 签名（不含 ignore 中出现的 n-gram）；空文本返回空签名"""
+    grams = shingles(text, k) - shingles(ignore, k) if ignore else shingles(text, k)
+    hashes = [zlib.crc32(s.encode()) for s in grams]
+    if not hashes:
+        return ()
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """两个签名估计出的 Jaccard 相似度"""
+    if not a or not b:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def cluster(texts: list[str], threshold: float, k: int = 3, ignore: str = "") -> list[int]:
+    """贪心聚类，返回每段文本的代表下标（代表自身的下标等于自己）"""
+    signatures = [signature(text, k, ignore) for text in texts]
+    reps: list[int] = []
+    heads: list[int] = []
+    for i, sig in enumerate(signatures):
+        rep = next((j for j in heads if similarity(sig, signatures[j]) >= threshold), i)
+        if rep == i:
+            heads.append(i)
+        reps.append(rep)
+    return reps
@@ -0,0 +1,84 @@
+"""shared.metrics - 进程内的轻量指标
+
+线程安全的计数器 + 耗时样本，按 (指标名, 标签) 聚合，供各 demo 统计
+解析失败率、缓存命中率、延迟分位数等。不依赖任何外部监控系统。
+
+用法：
+    from shared.metrics import metrics
+    metrics.incr("structured.calls", node="reviewer")
+    metrics.observe("tool.latency", 0.12, tool="web_search")
+    metrics.rate("structured.parse_failures", "structured.calls")
+"""
+
+import threading
+from collections import defaultdict
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def percentile(samples: list[float], p: float) -> float:
+    """最近邻法求分位数，p 取 0-100"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Metrics:
+    """计数器与耗时样本的集合"""
+
+    def __init__(self, max_samples: int = 10_000):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = defaultdict(float)
+        self._samples: dict[tuple, list[float]] = defaultdict(list)
+        self.max_samples = max_samples
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            samples = self._samples[_key(name, labels)]
+            samples.append(value)
+            if len(samples) > self.max_samples:
+                del samples[: len(samples) - self.max_samples]
+
+    def get(self, name: str, **labels) -> float:
+        """读取计数；不给标签时返回该指标所有标签的总和"""
+        with self._lock:
+            if labels:
+                return self._counters.get(_key(name, labels), 0)
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def samples(self, name: str, **labels) -> list[float]:
+        """读取耗时样本；不给标签时合并该指标所有标签的样本"""
+        with self._lock:
+            if labels:
+                return list(self._samples.get(_key(name, labels), []))
+            return [v for (n, _), vs in self._samples.items() if n == name for v in vs]
+
+    def rate(self, numerator: str, denominator: str, **labels) -> float:
+        """两个计数之比，分母为 0 时返回 0"""
+        total = self.get(denominator, **labels)
+        return self.get(numerator, **labels) / total if total else 0.0
+
+    def snapshot(self) -> dict[str, float]:
+        """所有计数的快照，键形如 "name{k=v,...}" """
+        with self._lock:
+            return {
+                name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                for (name, labels), value in sorted(self._counters.items())
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+
+
+# 进程级默认实例
+metrics = Metrics()
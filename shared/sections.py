@@ -0,0 +1,95 @@
+"""shared.sections - Markdown 文稿的章节 / 段落切分
+
+Reflection 循环里做「按章节增量修改」时使用：把草稿按标题切成章节，
+审核方按编号指出需要修改的章节，只重写这些章节，其余原样复用。
+段落切分 + 内容哈希则用于修改轮之间复用逐段分析的结果。
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+
+# 只按一、二级标题切分，三级及以下标题留在章节内部
+_HEADING = re.compile(r"^(#{1,2})\s+(.+?)\s*#*\s*$")
+
+
+@dataclass
+class Section:
+    """文稿中的一个章节"""
+    title: str   # 标题文本（不含 #），标题前的引言部分为空串
+    text: str    # 章节全文（包含标题行）
+
+
+def split_sections(markdown: str) -> list[Section]:
+    """按一、二级标题把 Markdown 切分为章节，拼回去与原文完全一致"""
+    sections: list[Section] = []
+    title = ""
+    lines: list[str] = []
+    in_code = False
+
+    for line in markdown.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        match = None if in_code else _HEADING.match(line.rstrip("\n"))
+        if match and lines:
+            sections.append(Section(title=title, text="".join(lines)))
+            lines = []
+        if match:
+            title = match.group(2)
+        lines.append(line)
+
+    if lines:
+        sections.append(Section(title=title, text="".join(lines)))
+    return sections
+
+
+def join_sections(sections: list[Section]) -> str:
+    """把章节拼回完整文稿，保证相邻章节之间有换行"""
+    parts = []
+    for section in sections:
+        text = section.text
+        if parts and not parts[-1].endswith("\n"):
+            parts[-1] += "\n\n"
+        parts.append(text)
+    return "".join(parts)
+
+
+def number_sections(sections: list[Section]) -> str:
+    """给每个章节加上【第 N 节】编号，供审核方按编号引用"""
+    return "\n\n".join(
+        f"【第 {i} 节】\n{section.text.strip()}" for i, section in enumerate(sections, 1)
+    )
+
+
+def outline(sections: list[Section]) -> str:
+    """章节目录（编号 + 标题），作为局部重写时的上下文"""
+    return "\n".join(
+        f"{i}. {section.title or '（引言）'}" for i, section in enumerate(sections, 1)
+    )
+
+
+def split_paragraphs(markdown: str) -> list[str]:
+    """按空行切分段落（代码块内的空行不切），去掉首尾空白"""
+    paragraphs: list[str] = []
+    lines: list[str] = []
+    in_code = False
+
+    for line in markdown.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        if not line.strip() and not in_code:
+            if lines:
+                paragraphs.append("\n".join(lines).strip())
+                lines = []
+            continue
+        lines.append(line)
+
+    if lines:
+        paragraphs.append("\n".join(lines).strip())
+    return paragraphs
+
+
+def content_hash(text: str) -> str:
+    """段落内容哈希（忽略空白差异），用作增量缓存的键"""
+    normalized = " ".join(text.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,134 @@
+"""shared.singleflight - 合并重复的在途执行
+
+双击按钮、或多个用户同时提交同一主题时，不必各自跑一遍完整流水线：同一个 key
+只有第一个请求（leader）真正启动执行，之后的请求直接挂到这次执行上，收到同样的流式事件和结果。
+
+- 执行放在独立线程中，不保留完整的帧历史：只维护一份由 merge 叠加出的最新快照，
+  加上最近 MAX_PENDING 帧的窗口；订阅者记住自己读到的序号，从窗口里取后续帧
+- 中途加入的订阅者先收到快照，再跟随后续帧；读得太慢、落后超出窗口的订阅者同样用快照追上
+- 没有 merge 时每一帧都视为完整快照（快照即最新一帧）
+- 执行结束（或抛异常）后 key 即释放，之后的请求会重新执行
+- 所有订阅者都离开（关闭页面、点击停止）时设置该次执行的取消事件，由 factory 协作式地停止；
+  已取消的执行不再接受订阅，同 key 的新请求会等它停下后重新执行
+- leader / join / abandon 次数记录在 shared.metrics 中
+
+用法：
+    flights = SingleFlight("report", merge=merge_frames)
+
+    def run(topic):
+        yield from flights.stream(normalize_text(topic), lambda cancel: _run(topic, cancel))
+"""
+
+import threading
+from collections import deque
+from typing import Any, Callable, Hashable, Iterator
+
+from shared.metrics import metrics
+
+# 每次执行保留的最近帧数：订阅者落后更多时直接用快照追上
+MAX_PENDING = 32
+
+
+class _Flight:
+    """一次在途执行的共享状态"""
+
+    def __init__(self):
+        self.snapshot: Any = None                          # 目前为止所有帧叠加成的快照
+        self.seq = 0                                       # 已产出的帧数
+        self.recent: deque = deque(maxlen=MAX_PENDING)     # 最近的帧，最后一帧的序号为 seq
+        self.done = False
+        self.error: BaseException | None = None
+        self.cond = threading.Condition()
+        self.cancel = threading.Event()
+        self.subscribers = 0
+
+
+class SingleFlight:
+    """按 key 合并在途的生成器执行"""
+
+    def __init__(self, name: str, merge: Callable[[Any, Any], Any] | None = None):
+        self.name = name
+        self.merge = merge
+        self._lock = threading.Lock()
+        self._flights: dict[Hashable, _Flight] = {}
+
+    def stream(self, key: Hashable, factory: Callable[[threading.Event], Iterator]) -> Iterator:
+        """订阅 key 对应的执行；没有在途执行时用 factory(cancel_event) 启动一次"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None or flight.cancel.is_set():
+                previous, flight = flight, _Flight()
+                self._flights[key] = flight
+                threading.Thread(target=self._run, args=(key, flight, factory, previous),
+                                 name=f"singleflight-{self.name}", daemon=True).start()
+                metrics.incr("singleflight.leaders", flight=self.name)
+            else:
+                metrics.incr("singleflight.joins", flight=self.name)
+            flight.subscribers += 1
+        yield from self._subscribe(flight)
+
+    def _run(self, key: Hashable, flight: _Flight, factory: Callable[[threading.Event], Iterator],
+             previous: _Flight | None) -> None:
+        # 同 key 上一次执行已取消但还没停下：等它停下，避免两次执行同时写同一份状态
+        if previous is not None:
+            with previous.cond:
+                previous.cond.wait_for(lambda: previous.done)
+        try:
+            for frame in factory(flight.cancel):
+                with flight.cond:
+                    if flight.seq and self.merge:
+                        flight.snapshot = self.merge(flight.snapshot, frame)
+                    else:
+                        flight.snapshot = frame
+                    flight.recent.append(frame)
+                    flight.seq += 1
+                    flight.cond.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            # 先释放 key 再标记结束：订阅者看到结束时，新的请求一定会重新执行
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def _subscribe(self, flight: _Flight) -> Iterator:
+        try:
+            yield from self._follow(flight)
+        finally:
+            # 正常读完、或订阅方关闭生成器（页面断开 / 停止按钮）都会走到这里
+            with self._lock:
+                flight.subscribers -= 1
+                abandoned = flight.subscribers == 0 and not flight.done
+            if abandoned:
+                flight.cancel.set()
+                metrics.incr("singleflight.abandoned", flight=self.name)
+
+    def _follow(self, flight: _Flight) -> Iterator:
+        with flight.cond:
+            seen, snapshot = flight.seq, flight.snapshot
+
+        # 中途加入：先给一份快照，不重放整段历史
+        if seen:
+            yield snapshot
+
+        while True:
+            with flight.cond:
+                while seen >= flight.seq and not flight.done:
+                    flight.cond.wait()
+                behind = flight.seq - seen
+                if behind > len(flight.recent):
+                    # 落后超出窗口：中间的帧已经丢弃，用快照追上
+                    pending = [flight.snapshot]
+                else:
+                    pending = list(flight.recent)[len(flight.recent) - behind:]
+                seen = flight.seq
+                finished = flight.done
+            yield from pending
+            if finished:
+                break
+
+        if flight.error is not None:
+            raise flight.error
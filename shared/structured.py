@@ -0,0 +1,179 @@
+"""shared.structured - 结构化（JSON）输出
+
+统一替代各节点里「手动剥 ``` 代码块 + json.loads，失败就静默用默认值」的写法：
+- 模型支持时在请求里声明 JSON Schema（OpenAI response_format），流式调用同样生效
+- 解析时容忍代码块包裹、前后多余文字，并校验必填字段
+- 解析失败时带着错误信息让模型修正，重试次数有上限，用尽后才返回默认值
+- stream_json 边生成边解析，字段一到就可以使用
+- 调用、解析失败、重试、兜底次数都记录在 shared.metrics 中（按节点名打标签）
+
+用法：
+    result = invoke_json(llm, messages, REVIEW_SCHEMA, name="reviewer", default=None)
+
+    for partial in stream_json(llm, messages, SCHEMA, name="adapter"):
+        show(partial.value)          # partial.done 为 True 时是最终校验过的结果
+"""
+
+import json
+import threading
+from typing import Any, Iterator, NamedTuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.utils.json import parse_json_markdown
+
+from shared.metrics import metrics
+
+# 解析失败后允许模型修正的次数
+MAX_RETRIES = 1
+
+REPAIR_PROMPT = """上面的输出无法按要求解析：{error}
+请修正后重新输出，只返回符合要求的 JSON，不要其他内容。"""
+
+
+class PartialJSON(NamedTuple):
+    """stream_json 每一步的产出"""
+    value: Any    # 目前为止解析出的对象（流式过程中可能不完整）
+    text: str     # 目前为止收到的原始文本
+    done: bool    # 是否为最终结果（已校验，或重试用尽后的默认值）
+
+
+def with_json_schema(model, schema: dict):
+    """模型支持时绑定原生 JSON Schema 输出模式，否则原样返回"""
+    if getattr(model, "_llm_type", "").startswith("openai"):
+        return model.bind(response_format={
+            "type": "json_schema",
+            "json_schema": {"name": schema.get("title", "output"), "schema": schema},
+        })
+    return model
+
+
+def validate(value: Any, schema: dict) -> str | None:
+    """轻量校验：顶层类型与必填字段。返回错误描述，通过时返回 None"""
+    expected = schema.get("type")
+    if expected == "object" and not isinstance(value, dict):
+        return f"顶层应为 JSON 对象，实际为 {type(value).__name__}"
+    if expected == "array" and not isinstance(value, list):
+        return f"顶层应为 JSON 数组，实际为 {type(value).__name__}"
+    if isinstance(value, dict):
+        missing = [key for key in schema.get("required", []) if key not in value]
+        if missing:
+            return f"缺少必填字段 {missing}"
+    return None
+
+
+def parse_json(text: str, schema: dict) -> Any:
+    """严格解析模型输出：剥离代码块和前后多余文字，并校验必填字段。失败抛 ValueError"""
+    try:
+        value = parse_json_markdown(text, parser=json.loads)
+    except json.JSONDecodeError:
+        # 模型在 JSON 前后夹带了说明文字：截取最外层括号之间的部分
+        start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+        end = max(text.rfind("}"), text.rfind("]"))
+        if start < 0 or end <= start:
+            raise
+        value = json.loads(text[start:end + 1])
+
+    error = validate(value, schema)
+    if error:
+        raise ValueError(error)
+    return value
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def _attempt(model, messages: list, schema: dict) -> tuple[str, Any, str | None]:
+    """调用一次模型并解析，返回 (原始文本, 结果, 错误)"""
+    text = _text(with_json_schema(model, schema).invoke(messages))
+    try:
+        return text, parse_json(text, schema), None
+    except ValueError as e:
+        return text, None, str(e)
+
+
+def _retry(model, messages: list, schema: dict, *, name: str, default: Any,
+           retries: int, text: str, error: str, cancel: threading.Event | None = None) -> Any:
+    """带着上一次的输出和错误让模型修正，最多 retries 次，用尽（或 cancel 被设置）后返回 default"""
+    for _ in range(retries):
+        if cancel is not None and cancel.is_set():
+            break
+        metrics.incr("structured.retries", node=name)
+        messages = messages + [AIMessage(content=text), HumanMessage(content=REPAIR_PROMPT.format(error=error))]
+        text, value, error = _attempt(model, messages, schema)
+        if error is None:
+            return value
+        metrics.incr("structured.parse_failures", node=name)
+
+    metrics.incr("structured.fallbacks", node=name)
+    return default
+
+
+def invoke_json(model, messages: list, schema: dict, *, name: str,
+                default: Any = None, retries: int = MAX_RETRIES) -> Any:
+    """调用模型并返回符合 schema 的 JSON；重试用尽后返回 default"""
+    metrics.incr("structured.calls", node=name)
+    messages = list(messages)
+    text, value, error = _attempt(model, messages, schema)
+    if error is None:
+        return value
+    metrics.incr("structured.parse_failures", node=name)
+    return _retry(model, messages, schema, name=name, default=default,
+                  retries=retries, text=text, error=error)
+
+
+def stream_json(model, messages: list, schema: dict, *, name: str, default: Any = None,
+                retries: int = MAX_RETRIES, cancel: threading.Event | None = None) -> Iterator[PartialJSON]:
+    """流式调用模型，随着输出到达不断产出部分解析的 JSON
+
+    最后一个产出的 done 为 True：要么是校验通过的完整结果，要么是修正重试用尽后的 default。
+    调用方中途停止迭代（break / close）会关闭底层的流式请求。
+    cancel 被设置后，在下一段输出到达时关闭流式请求、不再发起修正重试，直接结束（没有 done 的产出）。
+    """
+    metrics.incr("structured.calls", node=name)
+    messages = list(messages)
+    text = ""
+    last = None
+
+    for chunk in with_json_schema(model, schema).stream(messages):
+        if cancel is not None and cancel.is_set():
+            return
+        text += _text(chunk)
+        try:
+            value = parse_json_markdown(text)   # 容忍未闭合的括号和字符串
+        except (json.JSONDecodeError, ValueError):
+            continue
+        if value is not None and value != last:
+            last = value
+            yield PartialJSON(value, text, False)
+
+    try:
+        yield PartialJSON(parse_json(text, schema), text, True)
+        return
+    except ValueError as e:
+        error = str(e)
+    metrics.incr("structured.parse_failures", node=name)
+    # 修正重试是一次新的、非流式的模型调用：已取消时不再发起
+    if cancel is not None and cancel.is_set():
+        return
+    value = _retry(model, messages, schema, name=name, default=default,
+                   retries=retries, text=text, error=error, cancel=cancel)
+    if cancel is not None and cancel.is_set():
+        return
+    yield PartialJSON(value, text, True)
+
+
+def summary() -> str:
+    """结构化输出指标摘要，用于在 UI 上展示（进程启动以来所有运行的累计值，不是单次运行）"""
+    calls = metrics.get("structured.calls")
+    if not calls:
+        return "结构化输出（累计）：暂无调用"
+    return (
+        f"结构化输出（累计）：调用 {int(calls)} 次，"
+        f"解析失败率 {metrics.rate('structured.parse_failures', 'structured.calls'):.1%}，"
+        f"重试率 {metrics.rate('structured.retries', 'structured.calls'):.1%}，"
+        f"兜底率 {metrics.rate('structured.fallbacks', 'structured.calls'):.1%}"
+    )
@@ -0,0 +1,29 @@
+"""shared.text - 文本规范化
+
+缓存键、去重、关键词匹配都需要把「写法不同、意思相同」的文本归成同一个形式。
+这里只放与存储无关的纯函数，供 artifacts / dedup / toolcache 以及各 demo 共用：
+
+- normalize_text：激进的规范化，连标点一起去掉，适合主题、问题这类自然语言文本
+- normalize_query：保守的规范化，只统一全半角、大小写和连续空白；搜索查询等工具参数里的
+  标点有含义（「C#」与「c」、「3.5」与「35」、「node.js」与「nodejs」不是同一个查询）
+
+用法：
+    from shared.text import normalize_text
+    normalize_text(" 人工智能在医疗行业的应用前景？")  # "人工智能在医疗行业的应用前景"
+"""
+
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC（全角转半角）、小写、去掉空白和标点"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(ch for ch in text if not (ch.isspace() or unicodedata.category(ch).startswith("P")))
+
+
+def normalize_query(text: str) -> str:
+    """NFKC（全角转半角）、小写、连续空白合并为一个空格并去掉首尾空白，保留标点"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
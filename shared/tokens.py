@@ -0,0 +1,36 @@
+"""shared.tokens - 轻量的 token 估算工具
+
+不依赖 tiktoken 词表（首次使用需要联网下载），用字符规则粗略估算：
+中日韩字符约 1 token/字，其余文本约 4 字符/token。用于预算控制足够了。
+"""
+
+import re
+
+_CJK = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算一段文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, budget: int, marker: str = "…") -> str:
+    """把文本截断到大约 budget 个 token 以内（按行优先保留完整行）"""
+    if estimate_tokens(text) <= budget:
+        return text
+
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    if not kept:
+        # 首行就超预算：按字符硬截断（对中文而言 1 字 ≈ 1 token）
+        return text[:budget] + marker
+    return "\n".join(kept) + f"\n{marker}"
@@ -0,0 +1,144 @@
+"""shared.toolcache - 工具调用结果缓存
+
+搜索类工具在生产环境是按次计费、延迟高的外部 API，而同一个 ReAct 循环内、不同子问题之间
+经常用几乎相同的查询反复调用。tool_cache 装饰器放在 @tool 之下，为工具函数加上：
+
+- 规范化的查询键：全半角、大小写和连续空白的差异视为同一查询（标点保留，「C#」与「c」是不同的查询）
+- 每个工具独立的 TTL 和容量上限，超出容量按 LRU 淘汰
+- 防击穿：相同查询并发到达时只有一个真正调用，其余等待它的结果
+- 命中 / 未命中 / 合并等待次数记录在 shared.metrics 中（按工具名打标签）
+
+用法：
+    @tool
+    @tool_cache(ttl=600)
+    def web_search(query: str) -> str:
+        ...
+"""
+
+import functools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+from shared.metrics import metrics
+from shared.text import normalize_query
+
+# 默认容量（条）
+MAX_ENTRIES = 256
+
+# 记录当前线程最近一次调用是否由缓存直接给出结果（见 call_with_cache_info）
+_local = threading.local()
+# tool_cache 生成的包装函数 -> 未经缓存的原函数（见 uncached）
+_originals: "weakref.WeakKeyDictionary[Callable, Callable]" = weakref.WeakKeyDictionary()
+
+
+def _normalize_arg(value: Any) -> Hashable:
+    if isinstance(value, str):
+        return normalize_query(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize_arg(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize_arg(v)) for k, v in value.items()))
+    return value
+
+
+class ToolCache:
+    """单个工具的 TTL + LRU 缓存，带并发防击穿"""
+
+    def __init__(self, name: str, ttl: float, maxsize: int = MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._in_flight: dict[Hashable, Future] = {}
+
+    def get_or_call(self, key: Hashable, call: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                metrics.incr("tool_cache.hits", tool=self.name)
+                _local.cached = True
+                return entry[1]
+            if entry:
+                del self._entries[key]
+
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            # 相同查询正在调用中：等它的结果，不再重复请求外部 API
+            metrics.incr("tool_cache.coalesced", tool=self.name)
+            _local.cached = True
+            return future.result()
+
+        metrics.incr("tool_cache.misses", tool=self.name)
+        try:
+            value = call()
+        except BaseException as e:
+            # 失败不缓存，等待者一起收到异常
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                metrics.incr("tool_cache.evictions", tool=self.name)
+            del self._in_flight[key]
+        future.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def call_with_cache_info(call: Callable[[], Any]) -> tuple[Any, bool]:
+    """在当前线程执行 call，返回 (结果, 是否由缓存命中或并发合并给出)。
+
+    tool_guard 用它区分真正请求了后端的调用，只把这些调用的耗时计入 p95。
+    """
+    _local.cached = False
+    result = call()
+    return result, _local.cached
+
+
+def uncached(func: Callable) -> Callable:
+    """tool_cache 装饰过的函数返回未经缓存的原函数，其他函数原样返回（对冲请求用它绕过并发合并）"""
+    return _originals.get(func, func)
+
+
+def tool_cache(ttl: float, maxsize: int = MAX_ENTRIES):
+    """工具结果缓存装饰器；被装饰函数上的 .cache 可用于清空或检查"""
+    def decorator(func):
+        cache = ToolCache(func.__name__, ttl, maxsize)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (_normalize_arg(args), _normalize_arg(kwargs))
+            return cache.get_or_call(key, lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        _originals[wrapper] = func
+        return wrapper
+    return decorator
+
+
+def summary() -> str:
+    """工具缓存指标摘要，用于在 UI 上展示"""
+    hits = metrics.get("tool_cache.hits")
+    coalesced = metrics.get("tool_cache.coalesced")
+    total = hits + coalesced + metrics.get("tool_cache.misses")
+    if not total:
+        return "工具缓存：暂无调用"
+    return f"工具缓存：调用 {int(total)} 次，命中率 {hits / total:.1%}，并发合并 {int(coalesced)} 次"
@@ -0,0 +1,181 @@
+"""shared.toolguard - 工具调用的超时、熔断与对冲请求
+
+背后是外部 API 的工具（搜索、物流查询等）一旦变慢，会卡住整个 ReAct 循环。tool_guard
+装饰器放在 @tool 之下（有 tool_cache 时放在它之上，缓存命中不受影响），为每次调用加上：
+
+- 超时：每个工具独立的截止时间，超时即返回「工具不可用」结果，不再等待
+- 熔断：连续失败达到阈值后熔断一段时间，期间直接返回不可用（快速失败）；
+  冷却结束后放行一次试探调用，成功则恢复，失败则继续熔断
+- 对冲（可选）：调用耗时超过该工具近期的 p95 仍未返回时，再并行发一次相同请求，取先返回的结果。
+  下面有 tool_cache 时，对冲请求绕过缓存直接请求后端（否则会被并发合并到慢的那次请求上）；
+  p95 只统计真正请求了后端的调用，缓存命中不计入；耗时从第一次请求发出时算起，对冲赢了也一样
+
+「工具不可用」是一段 JSON 文本（status / tool / reason / hint），模型据此换用其他工具或基于已有信息继续，
+而不是整个 Agent 报错中断。超时、失败、熔断、对冲次数和调用耗时记录在 shared.metrics 中。
+
+用法：
+    @tool
+    @tool_guard(timeout=5, hedge=True)
+    @tool_cache(ttl=600)
+    def web_search(query: str) -> str:
+        ...
+"""
+
+import functools
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from shared.metrics import metrics, percentile
+from shared.toolcache import call_with_cache_info, uncached
+
+# 连续失败多少次后熔断，以及熔断持续的秒数
+FAILURE_THRESHOLD = 3
+RESET_AFTER = 30.0
+# 对冲请求：至少积累这么多耗时样本后才按 p95 触发，样本窗口为最近 HEDGE_WINDOW 次
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+
+# 所有受保护工具共用的执行线程池：超时后调用仍在后台跑完，不阻塞调用方
+_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="tool-guard")
+
+
+def unavailable(tool: str, reason: str) -> str:
+    """结构化的「工具不可用」结果"""
+    return json.dumps({
+        "status": "unavailable",
+        "tool": tool,
+        "reason": reason,
+        "hint": "该工具暂时不可用，请换用其他工具或基于已有信息继续回答，不要重复调用。",
+    }, ensure_ascii=False)
+
+
+class CircuitBreaker:
+    """连续失败计数的熔断器：closed → open → half-open → closed"""
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, reset_after: float = RESET_AFTER):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    def allow(self) -> bool:
+        """是否放行本次调用；熔断冷却结束后只放行一次试探"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_after:
+                return False
+            self._probing = True
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self) -> bool:
+        """记录一次失败，返回是否因此（重新）熔断"""
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.threshold):
+                self._opened_at = time.monotonic()
+                self._probing = False
+                return True
+            return False
+
+
+class ToolGuard:
+    """单个工具的保护策略"""
+
+    def __init__(self, name: str, timeout: float, hedge: bool = False,
+                 threshold: int = FAILURE_THRESHOLD, reset_after: float = RESET_AFTER):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(threshold, reset_after)
+        self._latencies: list[float] = []
+        self._lock = threading.Lock()
+
+    def _hedge_after(self) -> float | None:
+        with self._lock:
+            if not self.hedge or len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return percentile(self._latencies, 95)
+
+    def _observe(self, latency: float) -> None:
+        metrics.observe("tool.latency", latency, tool=self.name)
+        with self._lock:
+            self._latencies.append(latency)
+            del self._latencies[:-HEDGE_WINDOW]
+
+    def call(self, func, *args, **kwargs) -> str:
+        if not self.breaker.allow():
+            metrics.incr("tool_guard.short_circuits", tool=self.name)
+            return unavailable(self.name, "连续失败，已熔断")
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+        futures = [_pool.submit(_call, func, args, kwargs)]
+
+        hedge_after = self._hedge_after()
+        if hedge_after is not None and hedge_after < self.timeout:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                metrics.incr("tool_guard.hedges", tool=self.name)
+                # 经过 tool_cache 时，同一查询会被合并到仍在进行的第一次请求上，对冲必须绕过缓存
+                futures.append(_pool.submit(_call, uncached(func), args, kwargs))
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        metrics.incr("tool_guard.hedge_wins", tool=self.name)
+                    result, cached = future.result()
+                    if not cached:
+                        # 调用方感受到的耗时：从第一次请求算起，而不是从对冲请求发出时
+                        self._observe(time.monotonic() - started)
+                    self.breaker.success()
+                    return result
+                error = future.exception()
+
+        # 超时或所有请求都失败
+        if error is None:
+            metrics.incr("tool_guard.timeouts", tool=self.name)
+            reason = f"{self.timeout:g} 秒内未返回"
+        else:
+            metrics.incr("tool_guard.failures", tool=self.name)
+            reason = f"调用失败：{error}"
+        if self.breaker.failure():
+            metrics.incr("tool_guard.trips", tool=self.name)
+        return unavailable(self.name, reason)
+
+
+def _call(func, args: tuple, kwargs: dict) -> tuple[str, bool]:
+    """执行一次调用，返回 (结果, 是否由缓存给出)"""
+    return call_with_cache_info(lambda: func(*args, **kwargs))
+
+
+def tool_guard(timeout: float, hedge: bool = False,
+               threshold: int = FAILURE_THRESHOLD, reset_after: float = RESET_AFTER):
+    """工具保护装饰器；被装饰函数上的 .guard 可用于检查熔断器状态"""
+    def decorator(func):
+        guard = ToolGuard(func.__name__, timeout, hedge, threshold, reset_after)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return guard.call(func, *args, **kwargs)
+
+        wrapper.guard = guard
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+"""shared.ui - Gradio 流式界面的公共组件
+
+- LiveDraft：消费 LangGraph 的 stream_mode="messages"，把指定节点的 token
+  按模型调用（消息 id）归并成实时草稿，供长文本面板边生成边显示。
+- ProgressLog：进度日志，只展开最近若干条，更早的折叠成一行计数，控制 Markdown 重渲染的体积。
+- FrameThrottle：把高频的面板更新合并成固定帧率的帧，未变化的面板用 gr.skip() 跳过。
+- merge_frames：把增量帧叠加成完整快照（配合 shared.singleflight 给中途加入的订阅者补状态）。
+
+用法：
+    frames = FrameThrottle()
+    for event in app.stream(...):
+        ...
+        frame = frames.frame(progress.render(), live.render(), force=is_node_update)
+        if frame:
+            yield frame
+    yield frames.frame(progress.render(footer, full=True), report, force=True)
+"""
+
+import time
+
+import gradio as gr
+from langchain_core.messages import BaseMessageChunk
+
+# 每秒最多推送的帧数
+FRAME_RATE = 10
+# 进度面板展开显示的最近条数
+PROGRESS_VISIBLE = 12
+
+
+class LiveDraft:
+    """把若干节点的流式 token 拼成实时草稿"""
+
+    def __init__(self, nodes: dict[str, str]):
+        # 节点名 → 展示用的标签，例如 {"writer": "✍️ Writer"}
+        self.nodes = nodes
+        self.started = time.perf_counter()
+        self.first_token_at: float | None = None
+        self._node = ""
+        self._streams: dict[str, str] = {}
+
+    def feed(self, chunk: BaseMessageChunk, metadata: dict) -> bool:
+        """喂入一条 messages 事件，属于关注的节点且有文本时返回 True"""
+        node = metadata.get("langgraph_node", "")
+        if node not in self.nodes or not isinstance(chunk.content, str) or not chunk.content:
+            return False
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter() - self.started
+        self._node = node
+        # 同一节点里并行的多次调用（如按章节重写）各自成段，按首次出现的顺序展示
+        key = chunk.id or ""
+        self._streams[key] = self._streams.get(key, "") + chunk.content
+        return True
+
+    def render(self) -> str:
+        if not self._streams:
+            return ""
+        body = "\n\n---\n\n".join(self._streams.values())
+        return f"*（{self.nodes[self._node]} 实时生成中...）*\n\n{body}"
+
+    def reset(self) -> None:
+        """节点完成、拿到完整结果后清空实时内容"""
+        self._streams.clear()
+
+
+class ProgressLog:
+    """进度日志：最近的条目完整展示，更早的折叠"""
+
+    def __init__(self, header: str, visible: int = PROGRESS_VISIBLE):
+        self.header = header
+        self.visible = visible
+        self.entries: list[str] = []
+
+    def add(self, entry: str) -> None:
+        self.entries.append(entry)
+
+    def render(self, footer: str = "", full: bool = False) -> str:
+        """渲染进度面板；full=True 时展开全部条目（用于最后一帧）"""
+        entries = self.entries
+        folded = ""
+        if not full and len(entries) > self.visible:
+            folded = f"\n<small>…… 已折叠 {len(entries) - self.visible} 条较早的进度</small>\n"
+            entries = entries[-self.visible:]
+        return self.header + "\n\n" + folded + "".join(f"\n{entry}\n" for entry in entries) + footer
+
+
+class FrameThrottle:
+    """按固定帧率合并面板更新，只发送有变化的面板"""
+
+    def __init__(self, rate: float = FRAME_RATE):
+        self.interval = 1 / rate
+        self._sent: tuple | None = None
+        self._latest: tuple | None = None
+        self._last_emit = 0.0
+
+    def frame(self, *panes, force: bool = False) -> tuple | None:
+        """登记各面板的最新内容；到了出帧时间（或 force）时返回要 yield 的帧，否则返回 None
+
+        force 用于节点完成等低频但重要的事件：之后可能长时间没有新事件，不能让它卡在缓冲里。
+        """
+        self._latest = panes
+        if not force and time.perf_counter() - self._last_emit < self.interval:
+            return None
+        return self._emit()
+
+    def _emit(self) -> tuple | None:
+        panes, sent = self._latest, self._sent
+        if panes is None or panes == sent:
+            return None
+        self._sent = panes
+        self._last_emit = time.perf_counter()
+        if sent is None:
+            return panes
+        return tuple(gr.skip() if new == old else new for new, old in zip(panes, sent))
+
+
+def merge_frames(base: tuple, frame: tuple) -> tuple:
+    """把增量帧叠加到完整帧上（gr.skip() 的面板保留原值），得到当前界面的完整快照"""
+    skip = gr.skip()
+    return tuple(old if new == skip else new for old, new in zip(base, frame))